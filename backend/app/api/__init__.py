@@ -2,6 +2,6 @@
 API routes
 """
 
-from app.api import auth, annotations, wsi, labels, users, export, ai
+from app.api import auth, annotations, wsi, uploads, labels, users, export, ai
 
-__all__ = ["auth", "annotations", "wsi", "labels", "users", "export", "ai"]
+__all__ = ["auth", "annotations", "wsi", "uploads", "labels", "users", "export", "ai"]
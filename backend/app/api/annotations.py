@@ -2,54 +2,79 @@
 Annotation API routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, undefer
 from typing import List
-from shapely.geometry import shape, mapping
+from shapely.geometry import mapping
 from shapely.ops import unary_union
 
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
 from app.core.security import get_current_active_user
+from app.core.config import settings
 from app.models.user import User
 from app.models.annotation import Annotation
 from app.models.wsi import WSIFile
+from app.utils.annotation_import import ImportReport, RowSpool, build_rows, insert_rows, insert_spooled, spool_chunk
+from app.utils.annotation_revision import annotation_tile_namespace, bump_annotation_revision
+from app.utils.deepzoom import DeepZoomLayout
+from app.utils.geometry_lod import simplify_annotations, simplify_geometries
+from app.utils.geometry_metrics import geometries_from_geojson, geometries_to_wkb, stored_geometries, annotation_metrics
+from app.utils.http_cache import make_etag, etag_matches, not_modified, cached_response
+from app.utils.mvt import LayerBuilder, encode_tile, to_tile_space, DEFAULT_BUFFER, DEFAULT_EXTENT
+from app.utils.tile_cache import tile_cache
+from app.core.executors import tile_executor, ExecutorBusy
 from app.schemas.annotation import (
     AnnotationCreate, AnnotationUpdate, AnnotationResponse,
-    AnnotationBatchCreate
+    AnnotationBatchCreate, AnnotationImportResult, AnnotationChanges
 )
 
 router = APIRouter()
 
 def calculate_annotation_metrics(geometry: dict, mpp_x: float = None, mpp_y: float = None):
-    """Calculate area, perimeter, and centroid from geometry"""
+    """Calculate area, perimeter, centroid, bounding box and WKB copy from geometry"""
+    shapes = geometries_from_geojson([geometry])
+    metrics = {column: values[0] for column, values in annotation_metrics(shapes, mpp_x, mpp_y).items()}
+    metrics["geometry_wkb"] = geometries_to_wkb(shapes)[0]
+    return metrics
+
+def parse_bbox(bbox: str) -> tuple:
+    """Parse a ``minx,miny,maxx,maxy`` query parameter"""
     try:
-        geom = shape(geometry)
-        area_pixels = geom.area
-        perimeter_pixels = geom.length
-        
-        # Convert to microns if MPP available
-        if mpp_x and mpp_y:
-            area_um2 = area_pixels * mpp_x * mpp_y
-            perimeter_um = perimeter_pixels * ((mpp_x + mpp_y) / 2)
-        else:
-            area_um2 = None
-            perimeter_um = None
-        
-        centroid = geom.centroid
-        
-        return {
-            "area_um2": area_um2,
-            "perimeter_um": perimeter_um,
-            "centroid_x": centroid.x,
-            "centroid_y": centroid.y
-        }
-    except Exception:
-        return {
-            "area_um2": None,
-            "perimeter_um": None,
-            "centroid_x": None,
-            "centroid_y": None
-        }
+        min_x, min_y, max_x, max_y = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be minx,miny,maxx,maxy"
+        )
+    if min_x > max_x or min_y > max_y:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox minimum must not exceed maximum"
+        )
+    return min_x, min_y, max_x, max_y
+
+def level_scale(wsi_file: WSIFile, level: int) -> float:
+    """Level-0 pixels per pixel of a Deep Zoom level of a slide"""
+    layout = DeepZoomLayout.from_size(wsi_file.width or 1, wsi_file.height or 1)
+    if level < 0 or level > layout.max_level:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"level must be between 0 and {layout.max_level}"
+        )
+    return layout.downsample(level)
+
+def bbox_filter(query, min_x: float, min_y: float, max_x: float, max_y: float):
+    """Restrict an annotation query to bounding boxes intersecting a level-0 box"""
+    return query.filter(
+        Annotation.bbox_min_x <= max_x,
+        Annotation.bbox_max_x >= min_x,
+        Annotation.bbox_min_y <= max_y,
+        Annotation.bbox_max_y >= min_y
+    )
 
 @router.post("/", response_model=AnnotationResponse, status_code=status.HTTP_201_CREATED)
 async def create_annotation(
@@ -77,6 +102,7 @@ async def create_annotation(
     db_annotation = Annotation(
         **annotation.dict(),
         creator_id=current_user.id,
+        revision=bump_annotation_revision(db, wsi_file.id),
         **metrics
     )
     db.add(db_annotation)
@@ -99,45 +125,409 @@ async def create_annotations_batch(
             detail="WSI file not found"
         )
     
-    db_annotations = []
-    for annotation_data in batch.annotations:
-        metrics = calculate_annotation_metrics(
-            annotation_data.geometry,
-            wsi_file.mpp_x,
-            wsi_file.mpp_y
-        )
-        db_annotation = Annotation(
-            **annotation_data.dict(),
-            wsi_file_id=batch.wsi_file_id,
-            creator_id=current_user.id,
-            **metrics
-        )
-        db.add(db_annotation)
-        db_annotations.append(db_annotation)
-    
+    values = [annotation_data.dict(exclude={"wsi_file_id"}) for annotation_data in batch.annotations]
+    shapes = geometries_from_geojson([v["geometry"] for v in values])
+    rows = build_rows(values, shapes, wsi_file, current_user.id)
+    ids = insert_rows(db, rows, bump_annotation_revision(db, wsi_file.id), returning=True)
     db.commit()
-    for ann in db_annotations:
-        db.refresh(ann)
-    return db_annotations
+    return _response_query(db).filter(Annotation.id.in_(ids)).order_by(Annotation.id).all()
 
-@router.get("/wsi/{wsi_id}", response_model=List[AnnotationResponse])
-async def get_annotations_by_wsi(
+async def _ndjson_lines(request: Request):
+    """Yield the non-blank lines of a streamed NDJSON request body"""
+    pending = b""
+    async for data in request.stream():
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+@router.post("/wsi/{wsi_id}/import", response_model=AnnotationImportResult, status_code=status.HTTP_201_CREATED)
+async def import_annotations(
     wsi_id: int,
+    request: Request,
     layer_name: str = None,
+    is_ai_generated: bool = None,
+    ai_model_version: str = None,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get all annotations for a WSI file"""
-    query = db.query(Annotation).filter(
+    """Bulk import annotations from a GeoJSON FeatureCollection or NDJSON
+    
+    NDJSON bodies (``Content-Type: application/x-ndjson``) hold one GeoJSON
+    Feature or annotation object per line and are processed as they stream
+    in; other bodies must be a FeatureCollection or a list of features.
+    Annotation fields come from feature properties, with ``layer_name``,
+    ``is_ai_generated`` and ``ai_model_version`` overriding them when given.
+    Invalid records are skipped and reported; the rest are imported in one
+    transaction once the whole body has been read.
+    """
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
+    if not wsi_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="WSI file not found"
+        )
+    overrides = {
+        key: value for key, value in (
+            ("layer_name", layer_name),
+            ("is_ai_generated", is_ai_generated),
+            ("ai_model_version", ai_model_version),
+        ) if value is not None
+    }
+    creator_id = current_user.id
+    # End the read transaction before waiting on the client; the loaded
+    # slide stays usable detached
+    db.close()
+    
+    report = ImportReport()
+    chunk_size = settings.ANNOTATION_IMPORT_CHUNK_SIZE
+    spool = RowSpool()
+    try:
+        content_type = request.headers.get("content-type", "")
+        if "ndjson" in content_type or "jsonl" in content_type:
+            chunk, first_index = [], 0
+            async for line in _ndjson_lines(request):
+                chunk.append(line)
+                if len(chunk) == chunk_size:
+                    await asyncio.to_thread(
+                        spool_chunk, spool, chunk, first_index, wsi_file, creator_id, overrides, report
+                    )
+                    first_index += len(chunk)
+                    chunk = []
+            await asyncio.to_thread(
+                spool_chunk, spool, chunk, first_index, wsi_file, creator_id, overrides, report
+            )
+        else:
+            try:
+                document = json.loads(await request.body())
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Body is not valid JSON"
+                )
+            features = document.get("features") if isinstance(document, dict) else document
+            if not isinstance(features, list):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Expected a GeoJSON FeatureCollection or a list of features"
+                )
+            for first_index in range(0, len(features), chunk_size):
+                await asyncio.to_thread(
+                    spool_chunk, spool, features[first_index:first_index + chunk_size], first_index,
+                    wsi_file, creator_id, overrides, report
+                )
+        
+        # The whole body is validated; write it in one short transaction
+        if report.imported and await asyncio.to_thread(insert_spooled, db, spool, wsi_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="WSI file not found"
+            )
+    finally:
+        spool.close()
+    return report.as_dict()
+
+def _annotation_filters(query, wsi_id: int, layer_name: str = None, bbox: tuple = None):
+    """Apply the listing filters shared by every annotation read path"""
+    query = query.filter(
         Annotation.wsi_file_id == wsi_id,
         Annotation.deleted_at.is_(None)
     )
-    
     if layer_name:
         query = query.filter(Annotation.layer_name == layer_name)
+    if bbox:
+        query = bbox_filter(query, *bbox)
+    return query
+
+def _response_query(db: Session, scale: float = 1.0):
+    """Annotation query for response models
     
-    annotations = query.all()
-    return annotations
+    The deferred GeoJSON geometry is loaded with the rows at full
+    resolution; below it responses are built from the WKB copy.
+    """
+    query = db.query(Annotation)
+    if scale <= 1:
+        query = query.options(undefer(Annotation.geometry))
+    return query
+
+_RESPONSE_FIELDS = [name for name in AnnotationResponse.model_fields if name != "geometry"]
+
+def _annotation_responses(annotations: list, scale: float) -> list:
+    """Response models of a batch of annotations, simplified below full resolution"""
+    if scale <= 1:
+        return [AnnotationResponse.model_validate(annotation) for annotation in annotations]
+    simplified = simplify_annotations(annotations, scale)
+    return [
+        AnnotationResponse.model_validate(
+            dict({name: getattr(annotation, name) for name in _RESPONSE_FIELDS}, geometry=simplified[annotation.id])
+        )
+        for annotation in annotations
+    ]
+
+_STREAM_BATCH_SIZE = 1000
+
+def _stream_annotations(wsi_id: int, layer_name: str, bbox: tuple, scale: float, cursor: int):
+    """Yield annotations as NDJSON lines, holding one batch in memory at a time"""
+    # The request session may be closed before the response finishes streaming
+    db = SessionLocal()
+    try:
+        query = _annotation_filters(_response_query(db, scale), wsi_id, layer_name, bbox)
+        if cursor is not None:
+            query = query.filter(Annotation.id > cursor)
+        batch = []
+        for annotation in query.order_by(Annotation.id).yield_per(_STREAM_BATCH_SIZE):
+            batch.append(annotation)
+            if len(batch) == _STREAM_BATCH_SIZE:
+                yield "".join(r.model_dump_json() + "\n" for r in _annotation_responses(batch, scale))
+                batch = []
+        if batch:
+            yield "".join(r.model_dump_json() + "\n" for r in _annotation_responses(batch, scale))
+    finally:
+        db.close()
+
+@router.get("/wsi/{wsi_id}", response_model=List[AnnotationResponse])
+async def get_annotations_by_wsi(
+    wsi_id: int,
+    request: Request,
+    response: Response,
+    layer_name: str = None,
+    bbox: str = None,
+    level: int = None,
+    cursor: int = None,
+    limit: int = None,
+    format: str = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get all annotations for a WSI file
+    
+    With ``bbox=minx,miny,maxx,maxy`` only annotations whose bounding box
+    intersects it are returned. The box is in level-0 pixels, or in pixels
+    of Deep Zoom ``level`` when given. Below full resolution, ``level`` also
+    simplifies geometries to a fraction of a pixel at that level.
+    
+    ``limit`` returns one page ordered by id; pass the ``X-Next-Cursor``
+    response header back as ``cursor`` for the next page. ``format=ndjson``
+    (or ``Accept: application/x-ndjson``) streams every match as one JSON
+    object per line at constant memory.
+    
+    The ``X-Sync-Cursor`` response header is the ``since`` cursor of
+    ``/wsi/{wsi_id}/changes`` that picks up every change not in the
+    response; when paging, keep the one of the first page.
+    """
+    scale = 1.0
+    if level is not None:
+        wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
+        if not wsi_file:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="WSI file not found"
+            )
+        scale = level_scale(wsi_file, level)
+    
+    box = tuple(v * scale for v in parse_bbox(bbox)) if bbox else None
+    
+    # Read before the annotations: a change committed in between is then
+    # sent again by the changes feed instead of being skipped
+    revision = db.query(WSIFile.annotation_revision).filter(WSIFile.id == wsi_id).scalar()
+    sync_cursor = _sync_cursor(revision or 0)
+    
+    if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _stream_annotations(wsi_id, layer_name, box, scale, cursor),
+            media_type="application/x-ndjson",
+            headers={"X-Sync-Cursor": sync_cursor}
+        )
+    
+    response.headers["X-Sync-Cursor"] = sync_cursor
+    
+    query = _annotation_filters(_response_query(db, scale), wsi_id, layer_name, box)
+    if limit is None:
+        return _annotation_responses(query.all(), scale)
+    
+    if limit < 1 or limit > 10000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="limit must be between 1 and 10000"
+        )
+    if cursor is not None:
+        query = query.filter(Annotation.id > cursor)
+    annotations = query.order_by(Annotation.id).limit(limit + 1).all()
+    if len(annotations) > limit:
+        annotations = annotations[:limit]
+        response.headers["X-Next-Cursor"] = str(annotations[-1].id)
+    return _annotation_responses(annotations, scale)
+
+def _sync_cursor(revision: int, annotation_id: int = None) -> str:
+    """Sync cursor after every change up to ``revision``, or only up to ``annotation_id`` within it"""
+    return str(revision) if annotation_id is None else f"{revision},{annotation_id}"
+
+def _parse_sync_cursor(cursor: str) -> tuple:
+    """Parse a ``revision`` or ``revision,id`` sync cursor"""
+    try:
+        revision, _, annotation_id = cursor.partition(",")
+        return int(revision), int(annotation_id) if annotation_id else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync cursor"
+        )
+
+@router.get("/wsi/{wsi_id}/changes", response_model=AnnotationChanges)
+async def get_annotation_changes(
+    wsi_id: int,
+    since: str = None,
+    limit: int = 1000,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the annotations of a WSI file created, updated or deleted since a cursor
+    
+    Changed annotations are stamped with the slide's annotation revision,
+    which is taken under a lock on the slide row, so revisions commit in
+    order and a cursor never moves past a change still being written.
+    Start from the ``X-Sync-Cursor`` header of the annotation list; without
+    ``since`` only the current cursor is returned. Changes come in
+    (revision, id) order, ``limit`` at a time; poll again with the returned
+    cursor while ``has_more`` is set. Hard-deleted annotations are not
+    reported.
+    """
+    if limit < 1 or limit > 10000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="limit must be between 1 and 10000"
+        )
+    if since is None:
+        revision = db.query(WSIFile.annotation_revision).filter(WSIFile.id == wsi_id).scalar()
+        return {"annotations": [], "deleted": [], "cursor": _sync_cursor(revision or 0), "has_more": False}
+    
+    revision, last_id = _parse_sync_cursor(since)
+    query = _response_query(db).filter(Annotation.wsi_file_id == wsi_id)
+    if last_id is None:
+        query = query.filter(Annotation.revision > revision)
+    else:
+        query = query.filter(or_(
+            Annotation.revision > revision,
+            and_(Annotation.revision == revision, Annotation.id > last_id)
+        ))
+    changes = query.order_by(Annotation.revision, Annotation.id).limit(limit + 1).all()
+    
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if has_more:
+        since = _sync_cursor(changes[-1].revision, changes[-1].id)
+    elif changes:
+        # Every revision up to the last one seen has been committed in full
+        since = _sync_cursor(changes[-1].revision)
+    return {
+        "annotations": [annotation for annotation in changes if annotation.deleted_at is None],
+        "deleted": [annotation.id for annotation in changes if annotation.deleted_at is not None],
+        "cursor": since,
+        "has_more": has_more,
+    }
+
+_TILE_CACHE_CONTROL = "private, no-cache"
+
+def _render_annotation_tile(annotations, bounds, downsample: float) -> bytes:
+    """Clip, quantize and encode annotations as a vector tile (runs in the tile pool)"""
+    geometries = stored_geometries(annotations)
+    if downsample > 1:
+        geometries = simplify_geometries(geometries, downsample)
+    
+    layers = {}
+    for annotation, geometry in zip(annotations, geometries):
+        if geometry is None:
+            continue
+        try:
+            tile_geom = to_tile_space(geometry, bounds)
+        except Exception:
+            continue
+        if tile_geom is None:
+            continue
+        layer_name = annotation.layer_name or "default"
+        layer = layers.setdefault(layer_name, LayerBuilder(layer_name))
+        layer.add_feature(tile_geom, {
+            "id": annotation.id,
+            "label": annotation.label,
+            "color": annotation.color,
+            "confidence": annotation.confidence,
+            "is_ai_generated": bool(annotation.is_ai_generated),
+        }, feature_id=annotation.id)
+    return encode_tile(layers.values())
+
+@router.get("/wsi/{wsi_id}/tiles/{z}/{x}/{y}")
+async def get_annotation_tile(
+    wsi_id: int,
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    layer_name: str = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the annotations of one slide tile as a Mapbox Vector Tile
+    
+    Tiles follow the slide's Deep Zoom grid (``z`` is the Deep Zoom level),
+    hold one layer per annotation layer and use an extent of 4096.
+    """
+    wsi_file = db.query(
+        WSIFile.width, WSIFile.height, WSIFile.annotation_revision, WSIFile.created_at
+    ).filter(WSIFile.id == wsi_id).first()
+    if not wsi_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="WSI file not found"
+        )
+    layout = DeepZoomLayout.from_size(wsi_file.width or 1, wsi_file.height or 1, tile_size=settings.TILE_SIZE)
+    try:
+        layout.check_tile(z, x, y)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    
+    revision = wsi_file.annotation_revision or 0
+    # created_at tells a legacy slide apart from one that was given its reused id
+    etag = make_etag(
+        "annotations", wsi_id, wsi_file.created_at, revision, settings.TILE_SIZE, z, x, y, layer_name
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag, _TILE_CACHE_CONTROL)
+    
+    cache_key = (annotation_tile_namespace(wsi_id), "mvt", revision, z, x, y, layer_name)
+    tile_data = tile_cache.get(cache_key)
+    if tile_data is None:
+        # Unclipped tile extent in level-0 pixels
+        downsample = layout.downsample(z)
+        tile_span = settings.TILE_SIZE * downsample
+        bounds = (x * tile_span, y * tile_span, (x + 1) * tile_span, (y + 1) * tile_span)
+        pad = tile_span * DEFAULT_BUFFER / DEFAULT_EXTENT
+        
+        query = _annotation_filters(
+            db.query(
+                Annotation.id, Annotation.geometry_wkb, Annotation.layer_name,
+                Annotation.label, Annotation.color, Annotation.confidence, Annotation.is_ai_generated
+            ),
+            wsi_id, layer_name,
+            (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+        ).filter(Annotation.is_visible.isnot(False))
+        
+        try:
+            tile_data = await tile_executor.run(_render_annotation_tile, query.all(), bounds, downsample)
+        except ExecutorBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Tile server busy, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        tile_cache.put(cache_key, tile_data)
+    
+    return cached_response(tile_data, "application/vnd.mapbox-vector-tile", etag, _TILE_CACHE_CONTROL)
 
 @router.get("/{annotation_id}", response_model=AnnotationResponse)
 async def get_annotation(
@@ -146,7 +536,7 @@ async def get_annotation(
     db: Session = Depends(get_db)
 ):
     """Get a specific annotation"""
-    annotation = db.query(Annotation).filter(Annotation.id == annotation_id).first()
+    annotation = _response_query(db).filter(Annotation.id == annotation_id).first()
     if not annotation or annotation.deleted_at:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -162,7 +552,7 @@ async def update_annotation(
     db: Session = Depends(get_db)
 ):
     """Update an annotation"""
-    annotation = db.query(Annotation).filter(Annotation.id == annotation_id).first()
+    annotation = _response_query(db).filter(Annotation.id == annotation_id).first()
     if not annotation or annotation.deleted_at:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -193,6 +583,7 @@ async def update_annotation(
     
     # Increment version
     annotation.version += 1
+    annotation.revision = bump_annotation_revision(db, annotation.wsi_file_id)
     
     db.commit()
     db.refresh(annotation)
@@ -220,11 +611,13 @@ async def delete_annotation(
             detail="Not authorized to delete this annotation"
         )
     
+    revision = bump_annotation_revision(db, annotation.wsi_file_id)
     if hard_delete:
         db.delete(annotation)
     else:
         from datetime import datetime
         annotation.deleted_at = datetime.utcnow()
+        annotation.revision = revision
     
     db.commit()
     return None
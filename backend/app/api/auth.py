@@ -9,15 +9,23 @@ from datetime import timedelta
 
 from app.core.database import get_db
 from app.core.security import (
-    verify_password, get_password_hash, create_access_token,
-    get_current_active_user
+    verify_password_async, get_password_hash_async, create_access_token,
+    get_current_active_user, login_throttle
 )
+from app.core.executors import ExecutorBusy
 from app.core.config import settings
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse
 
 router = APIRouter()
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service busy, retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
@@ -32,7 +40,10 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await get_password_hash_async(user_data.password)
+    except ExecutorBusy:
+        raise _busy()
     db_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -51,9 +62,22 @@ async def login(
     db: Session = Depends(get_db)
 ):
     """Login and get access token"""
-    """Login and get access token"""
+    # Throttled before bcrypt runs, so guessing costs no CPU once locked out
+    retry_after = login_throttle.retry_after(form_data.username)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, try again later",
+            headers={"Retry-After": str(retry_after)}
+        )
+    
     user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    try:
+        valid = user is not None and await verify_password_async(form_data.password, user.hashed_password)
+    except ExecutorBusy:
+        raise _busy()
+    if not valid:
+        login_throttle.record_failure(form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -65,6 +89,7 @@ async def login(
             detail="Inactive user"
         )
     
+    login_throttle.reset(form_data.username)
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -2,213 +2,305 @@
 Export API routes for annotations
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import Response, StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-import json
-import csv
-import io
+from typing import Callable, Iterator, Optional
+import os
 
 from app.core.database import get_db
 from app.core.security import get_current_active_user
 from app.models.user import User
 from app.models.annotation import Annotation
+from app.models.job import Job
 from app.models.wsi import WSIFile
+from app.schemas.export import CohortExportRequest
+from app.schemas.job import JobResponse
+from app.utils.annotation_export import coco_export, csv_export, geojson_export
+from app.utils.deepzoom import DeepZoomLayout
+from app.utils.export_cache import export_cache
+from app.utils.http_cache import etag_matches, make_etag, not_modified
+from app.utils.job_queue import job_queue
+from app.utils.table_export import HAS_PYARROW, TABLE_FORMATS, table_export
+from app.utils import cohort_export  # registers the cohort_export job handler
+from app.utils import dataset_export  # registers the dataset_export job handler
 
 router = APIRouter()
 
+EXPORT_JOB_KINDS = ("dataset_export", "cohort_export")
+
+EXPORT_CACHE_CONTROL = "private, no-cache"  # revalidate: exports change with the annotations
+
+def _get_wsi_file(db: Session, wsi_id: int) -> WSIFile:
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
+    if not wsi_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="WSI file not found"
+        )
+    return wsi_file
+
+def _cached_export(request: Request, wsi_file: WSIFile, fmt: str, options: tuple, media_type: str,
+                   filename: str, export: Callable[[], Iterator[bytes]]) -> Response:
+    """Serve an export from the export cache, or stream it while caching it
+
+    The ETag and the cache key change with the slide's annotation revision.
+    """
+    key = (wsi_file.id, wsi_file.created_at.isoformat(), wsi_file.annotation_revision or 0, fmt, options)
+    etag = make_etag("export", *key)
+    if etag_matches(request, etag):
+        return not_modified(etag, EXPORT_CACHE_CONTROL)
+    headers = {"ETag": etag, "Cache-Control": EXPORT_CACHE_CONTROL}
+
+    path = export_cache.get(wsi_file.id, key)
+    if path is not None:
+        return FileResponse(path, media_type=media_type, filename=filename, headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(export_cache.stream(wsi_file.id, key, export()), media_type=media_type, headers=headers)
+
 @router.get("/wsi/{wsi_id}/coco")
 async def export_coco(
     wsi_id: int,
+    request: Request,
+    pretty: bool = False,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Export annotations in COCO JSON format"""
-    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
-    if not wsi_file:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="WSI file not found"
-        )
-    
-    annotations = db.query(Annotation).filter(
-        Annotation.wsi_file_id == wsi_id,
-        Annotation.deleted_at.is_(None)
-    ).all()
-    
-    # Build COCO format
-    coco_data = {
-        "info": {
-            "description": f"Annotations for {wsi_file.original_filename}",
-            "version": "1.0"
-        },
-        "images": [{
-            "id": 1,
-            "width": wsi_file.width or 0,
-            "height": wsi_file.height or 0,
-            "file_name": wsi_file.original_filename
-        }],
-        "annotations": [],
-        "categories": []
-    }
-    
-    # Extract unique categories
-    categories_map = {}
-    category_id = 1
-    
-    for ann in annotations:
-        if ann.label not in categories_map:
-            categories_map[ann.label] = category_id
-            coco_data["categories"].append({
-                "id": category_id,
-                "name": ann.label,
-                "supercategory": ann.label_hierarchy[0] if ann.label_hierarchy else "none"
-            })
-            category_id += 1
-        
-        # Convert GeoJSON to COCO segmentation format
-        geometry = ann.geometry
-        if geometry["type"] == "Polygon":
-            # Flatten coordinates
-            segmentation = []
-            for ring in geometry["coordinates"]:
-                flat = [coord for point in ring for coord in point]
-                segmentation.append(flat)
-        else:
-            segmentation = []
-        
-        # Calculate bbox
-        from shapely.geometry import shape
-        geom = shape(geometry)
-        bbox = list(geom.bounds)  # [minx, miny, maxx, maxy]
-        bbox[2] -= bbox[0]  # width
-        bbox[3] -= bbox[1]  # height
-        bbox = [bbox[0], bbox[1], bbox[2], bbox[3]]
-        
-        coco_data["annotations"].append({
-            "id": ann.id,
-            "image_id": 1,
-            "category_id": categories_map[ann.label],
-            "segmentation": segmentation,
-            "area": ann.area_um2 or 0,
-            "bbox": bbox,
-            "iscrowd": 0
-        })
-    
-    return Response(
-        content=json.dumps(coco_data, indent=2),
-        media_type="application/json",
-        headers={"Content-Disposition": f'attachment; filename="{wsi_file.original_filename}_coco.json"'}
+    wsi_file = _get_wsi_file(db, wsi_id)
+    return _cached_export(
+        request, wsi_file, "coco", (pretty,), "application/json", f"{wsi_file.original_filename}_coco.json",
+        lambda: coco_export(wsi_id, wsi_file.original_filename, wsi_file.width, wsi_file.height, pretty)
     )
 
 @router.get("/wsi/{wsi_id}/geojson")
 async def export_geojson(
     wsi_id: int,
+    request: Request,
+    pretty: bool = False,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Export annotations in GeoJSON format"""
-    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
-    if not wsi_file:
+    wsi_file = _get_wsi_file(db, wsi_id)
+    return _cached_export(
+        request, wsi_file, "geojson", (pretty,), "application/json",
+        f"{wsi_file.original_filename}_annotations.geojson", lambda: geojson_export(wsi_id, pretty)
+    )
+
+def _table_response(request: Request, db: Session, wsi_id: int, fmt: str) -> Response:
+    if not HAS_PYARROW:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="WSI file not found"
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Parquet and Arrow exports require pyarrow"
         )
-    
-    annotations = db.query(Annotation).filter(
-        Annotation.wsi_file_id == wsi_id,
-        Annotation.deleted_at.is_(None)
-    ).all()
-    
-    features = []
-    for ann in annotations:
-        feature = {
-            "type": "Feature",
-            "geometry": ann.geometry,
-            "properties": {
-                "id": ann.id,
-                "label": ann.label,
-                "label_hierarchy": ann.label_hierarchy,
-                "color": ann.color,
-                "opacity": ann.opacity,
-                "description": ann.description,
-                "confidence": ann.confidence,
-                "is_ai_generated": ann.is_ai_generated,
-                "layer_name": ann.layer_name,
-                "area_um2": ann.area_um2,
-                "perimeter_um": ann.perimeter_um,
-                "creator_id": ann.creator_id,
-                "created_at": ann.created_at.isoformat(),
-                "updated_at": ann.updated_at.isoformat()
-            }
-        }
-        features.append(feature)
-    
-    geojson = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-    
-    return Response(
-        content=json.dumps(geojson, indent=2),
-        media_type="application/json",
-        headers={"Content-Disposition": f'attachment; filename="{wsi_file.original_filename}_annotations.geojson"'}
+    wsi_file = _get_wsi_file(db, wsi_id)
+    return _cached_export(
+        request, wsi_file, fmt, (), TABLE_FORMATS[fmt],
+        f"{wsi_file.original_filename}_annotations.{fmt}", lambda: table_export(wsi_id, fmt)
     )
 
+@router.get("/wsi/{wsi_id}/parquet")
+async def export_parquet(
+    wsi_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Export annotations as a Parquet table with WKB geometry"""
+    return _table_response(request, db, wsi_id, "parquet")
+
+@router.get("/wsi/{wsi_id}/arrow")
+async def export_arrow(
+    wsi_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Export annotations as a memory-mappable Arrow IPC file with WKB geometry"""
+    return _table_response(request, db, wsi_id, "arrow")
+
 @router.get("/wsi/{wsi_id}/csv")
 async def export_csv(
     wsi_id: int,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Export annotation summary as CSV"""
+    wsi_file = _get_wsi_file(db, wsi_id)
+    return _cached_export(
+        request, wsi_file, "csv", (), "text/csv",
+        f"{wsi_file.original_filename}_annotations.csv", lambda: csv_export(wsi_id)
+    )
+
+@router.post("/wsi/{wsi_id}/dataset", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def export_dataset(
+    wsi_id: int,
+    level: Optional[int] = None,
+    tile_size: int = 512,
+    min_tissue: float = 0.1,
+    layer_name: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Start a background export of image and label mask tiles for model training
+
+    ``level`` is a Deep Zoom level of the ``tile_size`` layout (default: full
+    resolution). Poll the returned job and download the ZIP when it completes.
+    """
     wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
     if not wsi_file:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="WSI file not found"
         )
-    
-    annotations = db.query(Annotation).filter(
-        Annotation.wsi_file_id == wsi_id,
-        Annotation.deleted_at.is_(None)
-    ).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        "ID", "Label", "Label Hierarchy", "Geometry Type",
-        "Area (µm²)", "Perimeter (µm)", "Centroid X", "Centroid Y",
-        "Confidence", "AI Generated", "Layer", "Description",
-        "Creator ID", "Created At", "Updated At"
-    ])
-    
-    # Rows
-    for ann in annotations:
-        writer.writerow([
-            ann.id,
-            ann.label,
-            " > ".join(ann.label_hierarchy) if ann.label_hierarchy else "",
-            ann.geometry_type,
-            ann.area_um2 or "",
-            ann.perimeter_um or "",
-            ann.centroid_x or "",
-            ann.centroid_y or "",
-            ann.confidence or "",
-            ann.is_ai_generated,
-            ann.layer_name,
-            ann.description or "",
-            ann.creator_id,
-            ann.created_at.isoformat(),
-            ann.updated_at.isoformat()
-        ])
-    
-    output.seek(0)
-    return Response(
-        content=output.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="{wsi_file.original_filename}_annotations.csv"'}
+    if not wsi_file.is_processed:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="WSI file is still being processed"
+        )
+    if not 64 <= tile_size <= 4096:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="tile_size must be between 64 and 4096"
+        )
+    if not 0 <= min_tissue <= 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_tissue must be between 0 and 1"
+        )
+    layout = DeepZoomLayout.from_size(wsi_file.width, wsi_file.height, tile_size)
+    if level is not None and not 0 <= level <= layout.max_level:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"level must be between 0 and {layout.max_level}"
+        )
+
+    job = job_queue.enqueue(
+        db, "dataset_export", wsi_file.id,
+        payload={"level": level, "tile_size": tile_size, "min_tissue": min_tissue, "layer_name": layer_name},
+        creator_id=current_user.id
+    )
+    db.commit()
+    db.refresh(job)
+    return job
+
+@router.post("/cohort", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def export_cohort(
+    request: CohortExportRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Start a background export of the annotations of many slides into one ZIP
+
+    Slides are given as ``wsi_ids`` or selected by patient, study and/or a
+    label that occurs on them. Poll the returned job and download the
+    archive when it completes.
+    """
+    if request.format in TABLE_FORMATS and not HAS_PYARROW:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Parquet and Arrow exports require pyarrow"
+        )
+    query = db.query(WSIFile.id)
+    if request.wsi_ids:
+        query = query.filter(WSIFile.id.in_(request.wsi_ids))
+    elif not (request.patient_id or request.study_instance_uid or request.label):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give wsi_ids or at least one of patient_id, study_instance_uid and label"
+        )
+    if request.patient_id:
+        query = query.filter(WSIFile.patient_id == request.patient_id)
+    if request.study_instance_uid:
+        query = query.filter(WSIFile.study_instance_uid == request.study_instance_uid)
+    if request.label:
+        query = query.filter(WSIFile.id.in_(
+            db.query(Annotation.wsi_file_id).filter(
+                Annotation.label == request.label,
+                Annotation.deleted_at.is_(None)
+            )
+        ))
+    wsi_ids = [wsi_id for (wsi_id,) in query.order_by(WSIFile.id)]
+    if request.wsi_ids:
+        missing = sorted(set(request.wsi_ids) - set(wsi_ids))
+        if missing and not (request.patient_id or request.study_instance_uid or request.label):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"WSI files not found: {missing}"
+            )
+    if not wsi_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No WSI files match the cohort"
+        )
+
+    job = job_queue.enqueue(
+        db, "cohort_export",
+        payload={"wsi_ids": wsi_ids, "format": request.format, "pretty": request.pretty},
+        creator_id=current_user.id
     )
+    db.commit()
+    db.refresh(job)
+    return job
+
+def _export_job(db: Session, job_id: int, current_user: User) -> Job:
+    job = db.query(Job).filter(Job.id == job_id, Job.kind.in_(EXPORT_JOB_KINDS)).first()
+    if not job or (current_user.role != "admin" and job.creator_id != current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found"
+        )
+    return job
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_export_job(
+    job_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the progress of an export job"""
+    return _export_job(db, job_id, current_user)
+
+@router.post("/jobs/{job_id}/resume", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def resume_export_job(
+    job_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a failed export job again; cohort exports keep the slides already serialized"""
+    job = _export_job(db, job_id, current_user)
+    if job.status != "error":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export job is {job.status}"
+        )
+    job.status = "pending"
+    job.message = None
+    job.worker = None
+    job.finished_at = None
+    db.commit()
+    db.refresh(job)
+    return job
+
+@router.get("/jobs/{job_id}/download")
+async def download_export(
+    job_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Download the archive of a completed export job"""
+    job = _export_job(db, job_id, current_user)
+    if job.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export job is {job.status}"
+        )
+    path = (job.result or {}).get("path")
+    if not path or not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export archive no longer exists"
+        )
+    return FileResponse(path, media_type="application/zip", filename=os.path.basename(path))
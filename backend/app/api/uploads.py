@@ -0,0 +1,354 @@
+"""
+Resumable chunked WSI upload API routes
+
+A client initialises an upload, PUTs chunks at arbitrary byte offsets
+(in parallel and in any order, retrying only the chunks that failed) and
+finally completes the upload, which registers the slide like a regular
+upload. Chunks are streamed straight to a preallocated part file; uploads
+left idle for ``UPLOAD_SESSION_TTL_SECONDS`` are discarded.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy.orm import Session
+from typing import Dict, List
+from pathlib import Path
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+import aiofiles
+
+from app.core.database import get_db, SessionLocal
+from app.core.security import get_current_active_user
+from app.core.config import settings
+from app.models.user import User
+from app.models.upload import UploadSession
+from app.schemas.upload import UploadInit, UploadComplete, UploadSessionResponse
+from app.schemas.wsi import WSIFileResponse
+from app.api.wsi import validate_extension, register_wsi_file
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Per-process hashing state: upload id -> (sha256 object, bytes hashed so far).
+# Lost on restart, in which case the digest is recomputed from the part file.
+_hashers: Dict[str, list] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+
+_HASH_READ_SIZE = 4 * 1024 * 1024
+_CLEANUP_INTERVAL_SECONDS = 15 * 60
+
+def _part_path(upload_id: str) -> Path:
+    return Path(settings.UPLOAD_DIR) / ".partial" / f"{upload_id}.part"
+
+def _lock(upload_id: str) -> asyncio.Lock:
+    return _locks.setdefault(upload_id, asyncio.Lock())
+
+def _merge_ranges(ranges: List[List[int]]) -> List[List[int]]:
+    """Merge overlapping or adjacent [start, end) ranges"""
+    merged: List[List[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def _contiguous_end(ranges: List[List[int]]) -> int:
+    """Length of the fully received prefix of the file"""
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+def _advance_hash(upload_id: str, part_path: Path, end: int) -> None:
+    """Feed newly contiguous bytes into the running SHA-256 of an upload"""
+    state = _hashers.setdefault(upload_id, [hashlib.sha256(), 0])
+    hasher, hashed = state
+    if hashed >= end:
+        return
+    with open(part_path, "rb") as f:
+        f.seek(hashed)
+        while hashed < end:
+            data = f.read(min(_HASH_READ_SIZE, end - hashed))
+            if not data:
+                break
+            hasher.update(data)
+            hashed += len(data)
+    state[1] = hashed
+
+def _session_response(upload: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=upload.id,
+        original_filename=upload.original_filename,
+        total_size=upload.total_size,
+        received_ranges=upload.received_ranges or [],
+        received_bytes=upload.received_bytes or 0,
+        sha256=upload.sha256,
+        status=upload.status,
+        wsi_file_id=upload.wsi_file_id,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE,
+        created_at=upload.created_at,
+        updated_at=upload.updated_at,
+    )
+
+def _get_upload(db: Session, upload_id: str, current_user: User) -> UploadSession:
+    upload = db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+    if not upload or (upload.uploader_id != current_user.id and current_user.role != "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    return upload
+
+@router.post("/", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def init_upload(
+    upload_init: UploadInit,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Start a resumable chunked upload"""
+    validate_extension(upload_init.filename)
+    if upload_init.size <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload size must be positive"
+        )
+    if upload_init.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds maximum upload size of {settings.MAX_UPLOAD_SIZE} bytes"
+        )
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        original_filename=Path(upload_init.filename).name,
+        total_size=upload_init.size,
+        received_ranges=[],
+        received_bytes=0,
+        study_instance_uid=upload_init.study_instance_uid,
+        patient_id=upload_init.patient_id,
+        uploader_id=current_user.id
+    )
+
+    # Preallocate the part file so chunks can be written at any offset
+    part_path = _part_path(upload.id)
+    part_path.parent.mkdir(parents=True, exist_ok=True)
+    async with aiofiles.open(part_path, "wb") as f:
+        await f.truncate(upload.total_size)
+
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return _session_response(upload)
+
+@router.get("/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get upload progress, including the byte ranges already received"""
+    return _session_response(_get_upload(db, upload_id, current_user))
+
+@router.put("/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Write the request body at ``offset`` of the upload"""
+    upload = _get_upload(db, upload_id, current_user)
+    if upload.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload is {upload.status}"
+        )
+    if offset < 0 or offset >= upload.total_size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail=f"Offset must be within [0, {upload.total_size})"
+        )
+
+    part_path = _part_path(upload_id)
+    written = 0
+    async with aiofiles.open(part_path, "r+b") as f:
+        await f.seek(offset)
+        async for data in request.stream():
+            if offset + written + len(data) > upload.total_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Chunk extends past the declared size of {upload.total_size} bytes"
+                )
+            await f.write(data)
+            written += len(data)
+
+    if written:
+        async with _lock(upload_id):
+            # The row lock serialises merges across worker processes
+            upload = (
+                db.query(UploadSession)
+                .filter(UploadSession.id == upload_id)
+                .populate_existing()
+                .with_for_update()
+                .first()
+            )
+            if upload is None or upload.status != "uploading":
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Upload is no longer in progress"
+                )
+            ranges = _merge_ranges((upload.received_ranges or []) + [[offset, offset + written]])
+            upload.received_ranges = ranges
+            upload.received_bytes = sum(end - start for start, end in ranges)
+            db.commit()
+            # Hash the newly contiguous prefix while it is still in the page cache
+            await asyncio.to_thread(_advance_hash, upload_id, part_path, _contiguous_end(ranges))
+
+    db.refresh(upload)
+    return _session_response(upload)
+
+@router.post("/{upload_id}/complete", response_model=WSIFileResponse, status_code=status.HTTP_201_CREATED)
+async def complete_upload(
+    upload_id: str,
+    upload_complete: UploadComplete = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Verify a fully received upload and register it as a WSI file"""
+    upload = _get_upload(db, upload_id, current_user)
+    if upload.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload is {upload.status}"
+        )
+    if _contiguous_end(upload.received_ranges or []) != upload.total_size:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload incomplete: received {upload.received_bytes} of {upload.total_size} bytes"
+        )
+
+    # Claim the upload so concurrent completes and aborts back off
+    claimed = (
+        db.query(UploadSession)
+        .filter(UploadSession.id == upload_id, UploadSession.status == "uploading")
+        .update({UploadSession.status: "completing"}, synchronize_session=False)
+    )
+    db.commit()
+    if not claimed:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is already being completed"
+        )
+
+    part_path = _part_path(upload_id)
+    try:
+        async with _lock(upload_id):
+            await asyncio.to_thread(_advance_hash, upload_id, part_path, upload.total_size)
+            digest = _hashers[upload_id][0].hexdigest()
+
+        if upload_complete and upload_complete.sha256 and upload_complete.sha256.lower() != digest:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Checksum mismatch: server computed {digest}"
+            )
+
+        # Committed together with the WSI record
+        upload.sha256 = digest
+        upload.status = "completed"
+        db_wsi = register_wsi_file(
+            db, part_path, digest, upload.original_filename, current_user,
+            study_instance_uid=upload.study_instance_uid, patient_id=upload.patient_id
+        )
+    except BaseException:
+        # Hand the upload back so the client can retry or abort it
+        db.rollback()
+        db.query(UploadSession).filter(
+            UploadSession.id == upload_id, UploadSession.status == "completing"
+        ).update({UploadSession.status: "uploading"}, synchronize_session=False)
+        db.commit()
+        raise
+    _hashers.pop(upload_id, None)
+    _locks.pop(upload_id, None)
+
+    upload.wsi_file_id = db_wsi.id
+    db.commit()
+    return db_wsi
+
+@router.delete("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Abort an upload and discard the bytes received so far"""
+    upload = _get_upload(db, upload_id, current_user)
+    if upload.status == "completing":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is being completed"
+        )
+    if upload.status == "uploading":
+        part_path = _part_path(upload_id)
+        if part_path.exists():
+            os.remove(part_path)
+        _hashers.pop(upload_id, None)
+        _locks.pop(upload_id, None)
+    db.delete(upload)
+    db.commit()
+    return None
+
+def discard_stale_uploads() -> int:
+    """Delete uploads left idle past their TTL and hash state this process no longer needs"""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS)
+    db = SessionLocal()
+    try:
+        stale = [
+            upload_id for (upload_id,) in db.query(UploadSession.id).filter(
+                UploadSession.status.in_(("uploading", "completing")),
+                UploadSession.updated_at < cutoff
+            )
+        ]
+        discarded = 0
+        for upload_id in stale:
+            # Skip uploads that received a chunk since they were listed
+            deleted = db.query(UploadSession).filter(
+                UploadSession.id == upload_id,
+                UploadSession.status.in_(("uploading", "completing")),
+                UploadSession.updated_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            if deleted:
+                _part_path(upload_id).unlink(missing_ok=True)
+                discarded += 1
+
+        # Hash state of uploads completed, aborted or discarded by any process
+        tracked = set(_hashers) | set(_locks)
+        if tracked:
+            active = {
+                upload_id for (upload_id,) in db.query(UploadSession.id).filter(
+                    UploadSession.id.in_(tracked),
+                    UploadSession.status.in_(("uploading", "completing"))
+                )
+            }
+            for upload_id in tracked - active:
+                _hashers.pop(upload_id, None)
+                _locks.pop(upload_id, None)
+        return discarded
+    finally:
+        db.close()
+
+async def discard_stale_uploads_periodically() -> None:
+    """Run ``discard_stale_uploads`` until cancelled"""
+    while True:
+        try:
+            discarded = await asyncio.to_thread(discard_stale_uploads)
+            if discarded:
+                logger.info("Discarded %d stale uploads", discarded)
+        except Exception:
+            logger.exception("Upload cleanup failed")
+        await asyncio.sleep(_CLEANUP_INTERVAL_SECONDS)
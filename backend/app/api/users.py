@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from app.core.database import get_db
-from app.core.security import get_current_active_user, require_role
+from app.core.security import get_current_active_user, require_role, user_cache
 from app.models.user import User, UserRole
 from app.schemas.user import UserResponse, UserUpdate
 
@@ -74,4 +74,6 @@ async def update_user(
     
     db.commit()
     db.refresh(user)
+    # Role and active flag changes must apply to tokens already in use
+    user_cache.invalidate_user(user.id)
     return user
@@ -2,29 +2,42 @@
 WSI file management API routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from pathlib import Path
-import shutil
+from fastapi.responses import Response
 import os
-from PIL import Image
-
-# Optional openslide import (requires system libraries)
-try:
-    import openslide
-    HAS_OPENSLIDE = True
-except ImportError:
-    HAS_OPENSLIDE = False
-    openslide = None
+import uuid
+import base64
+from urllib.parse import urlencode
+import hashlib
+import aiofiles
 
 from app.core.database import get_db
-from app.core.security import get_current_active_user
+from app.core.security import get_current_active_user, get_tile_access, sign_tile_access
 from app.core.config import settings
 from app.models.user import User
 from app.models.wsi import WSIFile
-from app.schemas.wsi import WSIFileResponse, WSITileRequest
-from app.utils.wsi_processor import process_wsi_file, get_wsi_tile
+from app.models.job import Job
+from app.models.upload import UploadSession
+from app.schemas.wsi import WSIFileResponse, WSIFileUpdate, WSITileRequest
+from app.schemas.job import JobResponse
+from app.utils.wsi_processor import get_wsi_tile, get_dzi_tile
+from app.utils.deepzoom import DeepZoomLayout
+from app.utils.pyramid import read_pyramid_tile, load_manifest, delete_pyramid
+from app.utils.slide_pool import slide_pool
+from app.utils.blob_store import store_blob, release_blob
+from app.utils.slide_registry import slide_registry, slide_namespace, SlideRef
+from app.utils.tile_cache import tile_cache, dzi_tile_key
+from app.utils.export_cache import export_cache
+from app.utils.annotation_revision import annotation_tile_namespace
+from app.core.executors import tile_executor, ExecutorBusy
+from app.utils.job_queue import job_queue
+from app.utils.previews import clamp_preview_size, get_thumbnail, get_associated_preview, delete_previews
+from app.utils.http_cache import make_etag, etag_matches, not_modified, cached_response
+from app.utils import ingest  # registers the ingest job handler
+from app.utils import recompute_metrics  # registers the recompute_metrics job handler
 
 router = APIRouter()
 
@@ -37,80 +50,92 @@ async def upload_wsi(
     db: Session = Depends(get_db)
 ):
     """Upload a WSI file"""
-    # Validate file extension
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type {file_ext} not allowed. Allowed: {settings.ALLOWED_EXTENSIONS}"
-        )
+    validate_extension(file.filename)
     
-    # Save file
-    upload_dir = Path(settings.UPLOAD_DIR)
-    file_path = upload_dir / f"{current_user.id}_{file.filename}"
+    # Stream the upload to disk, hashing it and enforcing the size limit as bytes arrive
+    tmp_path = Path(settings.UPLOAD_DIR) / ".partial" / f"{uuid.uuid4().hex}.upload"
+    tmp_path.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    file_size = file_path.stat().st_size
+    hasher = hashlib.sha256()
+    written = 0
+    async with aiofiles.open(tmp_path, "wb") as buffer:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            written += len(chunk)
+            if written > settings.MAX_UPLOAD_SIZE:
+                break
+            hasher.update(chunk)
+            await buffer.write(chunk)
+    if written > settings.MAX_UPLOAD_SIZE:
+        os.remove(tmp_path)
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds maximum upload size of {settings.MAX_UPLOAD_SIZE} bytes"
+        )
     
-    # Process WSI metadata
-    try:
-        if file_ext in [".svs", ".tiff", ".tif", ".ndpi", ".mrxs"]:
-            if not HAS_OPENSLIDE:
-                raise HTTPException(
-                    status_code=status.HTTP_501_NOT_IMPLEMENTED,
-                    detail="OpenSlide library not available. WSI file processing requires openslide-python and system libraries."
-                )
-            slide = openslide.OpenSlide(str(file_path))
-            width, height = slide.dimensions
-            mpp_x = float(slide.properties.get(openslide.PROPERTY_NAME_MPP_X, 0))
-            mpp_y = float(slide.properties.get(openslide.PROPERTY_NAME_MPP_Y, 0))
-            levels = slide.level_count
-            magnification = float(slide.properties.get(openslide.PROPERTY_NAME_OBJECTIVE_POWER, 0))
-            metadata = dict(slide.properties)
-            slide.close()
-        else:
-            # Regular image
-            img = Image.open(file_path)
-            width, height = img.size
-            mpp_x = mpp_y = None
-            levels = 1
-            magnification = None
-            metadata = {}
-    except Exception as e:
+    return register_wsi_file(
+        db, tmp_path, hasher.hexdigest(), file.filename, current_user,
+        study_instance_uid=study_instance_uid, patient_id=patient_id
+    )
+
+def validate_extension(filename: str) -> str:
+    """Return the lower-cased extension of an upload, rejecting disallowed types"""
+    file_ext = Path(filename).suffix.lower()
+    if file_ext not in settings.ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Error processing WSI file: {str(e)}"
+            detail=f"File type {file_ext} not allowed. Allowed: {settings.ALLOWED_EXTENSIONS}"
         )
+    return file_ext
+
+def register_wsi_file(
+    db: Session,
+    tmp_path: Path,
+    sha256: str,
+    original_filename: str,
+    uploader: User,
+    study_instance_uid: str = None,
+    patient_id: str = None
+) -> WSIFile:
+    """Move a received upload into the blob store, create its record and queue its ingest
+    
+    Identical content is stored once; the new record references the
+    existing blob and shares its cached tiles and pyramid. Metadata
+    extraction and pyramid building happen in the ``ingest`` job.
+    """
+    file_ext = Path(original_filename).suffix.lower()
+    blob = store_blob(db, tmp_path, sha256, file_ext)
+    file_path = Path(blob.file_path)
     
     # Create database record
     db_wsi = WSIFile(
         filename=file_path.name,
-        original_filename=file.filename,
+        original_filename=original_filename,
         file_path=str(file_path),
-        file_size=file_size,
+        file_size=blob.file_size,
         file_format=file_ext,
-        width=width,
-        height=height,
-        mpp_x=mpp_x,
-        mpp_y=mpp_y,
-        magnification=magnification,
-        levels=levels,
-        wsi_metadata=metadata,
+        content_sha256=sha256,
         study_instance_uid=study_instance_uid,
         patient_id=patient_id,
-        uploader_id=current_user.id
+        uploader_id=uploader.id,
+        is_processed=False,
+        processing_status="pending"
     )
     db.add(db_wsi)
+    db.flush()
+    job_queue.enqueue(db, "ingest", wsi_file_id=db_wsi.id, creator_id=uploader.id)
     db.commit()
     db.refresh(db_wsi)
-    
-    # Process WSI in background (tile generation, etc.)
-    # This would typically be done in a background task
-    
     return db_wsi
 
+def _remove_slide_data(file_path: str, namespace: str) -> None:
+    """Close handles, drop caches and delete the file of an unreferenced slide"""
+    slide_pool.evict(file_path)
+    tile_cache.invalidate(namespace)
+    delete_pyramid(namespace)
+    delete_previews(namespace)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
 @router.get("/", response_model=List[WSIFileResponse])
 async def list_wsi_files(
     skip: int = 0,
@@ -122,6 +147,61 @@ async def list_wsi_files(
     wsi_files = db.query(WSIFile).offset(skip).limit(limit).all()
     return wsi_files
 
+@router.get("/stats/tiles")
+async def get_tile_stats(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get tile cache and slide handle pool counters"""
+    return {
+        "cache": tile_cache.stats(),
+        "slide_handles": slide_pool.stats(),
+        "executor": tile_executor.stats(),
+    }
+
+@router.get("/thumbnails")
+async def get_thumbnails(
+    ids: str,
+    max: int = settings.THUMBNAIL_SIZE,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get thumbnails of several WSI files as data URIs, keyed by id
+    
+    Lets slide lists fetch a whole page of previews in one request.
+    Slides that are still being ingested are left out.
+    """
+    try:
+        wanted = [int(wsi_id) for wsi_id in ids.split(",") if wsi_id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma-separated list of integers"
+        )
+    if len(wanted) > 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At most 200 thumbnails per request"
+        )
+    
+    size = clamp_preview_size(max)
+    thumbnails = {}
+    for wsi_file in db.query(WSIFile).filter(WSIFile.id.in_(wanted)).all():
+        if not _tiles_ready(wsi_file):
+            continue
+        slide = slide_registry.remember(wsi_file)
+        try:
+            data = await tile_executor.run(get_thumbnail, slide.namespace, slide.file_path, slide.is_flat, size)
+        except ExecutorBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Tile server busy, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        except Exception:
+            continue
+        thumbnails[str(wsi_file.id)] = "data:image/jpeg;base64," + base64.b64encode(data).decode()
+    return thumbnails
+
 @router.get("/{wsi_id}", response_model=WSIFileResponse)
 async def get_wsi_file(
     wsi_id: int,
@@ -137,6 +217,70 @@ async def get_wsi_file(
         )
     return wsi_file
 
+@router.patch("/{wsi_id}", response_model=WSIFileResponse)
+async def update_wsi_file(
+    wsi_id: int,
+    wsi_update: WSIFileUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Update slide metadata; correcting the resolution re-measures its annotations"""
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
+    if not wsi_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="WSI file not found"
+        )
+    
+    # Check permissions (admin or owner)
+    if current_user.role != "admin" and wsi_file.uploader_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to update this file"
+        )
+    
+    update_data = wsi_update.dict(exclude_unset=True)
+    for field in ("mpp_x", "mpp_y", "magnification"):
+        if update_data.get(field) is not None and update_data[field] <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{field} must be positive"
+            )
+    resolution_changed = any(
+        field in update_data and update_data[field] != getattr(wsi_file, field)
+        for field in ("mpp_x", "mpp_y")
+    )
+    for field, value in update_data.items():
+        setattr(wsi_file, field, value)
+    
+    if resolution_changed:
+        job_queue.enqueue(db, "recompute_metrics", wsi_file.id, creator_id=current_user.id)
+    db.commit()
+    db.refresh(wsi_file)
+    return wsi_file
+
+@router.get("/{wsi_id}/status")
+async def get_wsi_status(
+    wsi_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the processing status of a WSI file and its background jobs"""
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
+    if not wsi_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="WSI file not found"
+        )
+    jobs = db.query(Job).filter(Job.wsi_file_id == wsi_id).order_by(Job.id).all()
+    return {
+        "wsi_file_id": wsi_id,
+        "processing_status": wsi_file.processing_status,
+        "is_processed": wsi_file.is_processed,
+        "error": (wsi_file.wsi_metadata or {}).get("error"),
+        "jobs": [JobResponse.model_validate(job) for job in jobs],
+    }
+
 @router.get("/{wsi_id}/tile-source")
 async def get_tile_source(
     wsi_id: int,
@@ -151,44 +295,308 @@ async def get_tile_source(
             detail="WSI file not found"
         )
     
-    # For OpenSeadragon, we'll use a custom tile source function
-    # that calls our tile endpoint
+    # Deep Zoom tile source; OpenSeadragon accepts the descriptor inline
+    layout = DeepZoomLayout.from_size(
+        wsi_file.width or 1, wsi_file.height or 1, tile_size=settings.TILE_SIZE
+    )
     tile_source = {
-        "type": "custom",
-        "tileSource": {
-            "getTileUrl": f"/api/wsi/{wsi_id}/tile",
-            "width": wsi_file.width or 0,
-            "height": wsi_file.height or 0,
-            "tileSize": 256,
-            "tileOverlap": 0,
-            "minLevel": 0,
-            "maxLevel": wsi_file.levels or 0,
-        }
+        "type": "dzi",
+        # Signed query string that authorizes tile and preview URLs without a header
+        "tileQuery": urlencode(sign_tile_access(wsi_id, slide_namespace(wsi_file))),
+        "dzi": f"/api/wsi/{wsi_id}/dzi",
+        "tileSource": layout.dzi_json(url=f"/api/wsi/{wsi_id}_files/"),
+        "width": layout.width,
+        "height": layout.height,
+        "tileSize": layout.tile_size,
+        "tileOverlap": layout.overlap,
+        "minLevel": 0,
+        "maxLevel": layout.max_level,
     }
     return tile_source
 
+@router.get("/{wsi_id}/dzi")
+async def get_dzi(
+    wsi_id: int,
+    format: str = "jpeg",
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the Deep Zoom (DZI) descriptor of a WSI file"""
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
+    if not wsi_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="WSI file not found"
+        )
+    
+    layout = DeepZoomLayout.from_size(
+        wsi_file.width or 1, wsi_file.height or 1, tile_size=settings.TILE_SIZE
+    )
+    return Response(content=layout.dzi_xml(format), media_type="application/xml")
+
+def _tiles_ready(wsi_file: WSIFile) -> bool:
+    """OpenSlide slides serve tiles once ingest has read their metadata;
+    flat images only once their pyramid is built"""
+    metadata_ready = bool(wsi_file.wsi_metadata) and wsi_file.wsi_metadata.get("tile_source") == "openslide"
+    return wsi_file.processing_status == "completed" or metadata_ready
+
+def _resolve_slide(db: Session, wsi_id: int) -> SlideRef:
+    """Look up what the tile path needs to know about a slide, cached in-process"""
+    ref = slide_registry.get(wsi_id)
+    if ref is not None:
+        return ref
+    
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
+    if not wsi_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="WSI file not found"
+        )
+    if not _tiles_ready(wsi_file):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Slide tiles not available yet (status: {wsi_file.processing_status})"
+        )
+    return slide_registry.remember(wsi_file)
+
+async def _preview_response(request: Request, etag: str, render, *args) -> Response:
+    """Serve a preview image, honouring If-None-Match"""
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        data = await tile_executor.run(render, *args)
+    except ExecutorBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Tile server busy, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e.args[0]) if e.args else "Image not found"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting preview: {str(e)}"
+        )
+    return cached_response(data, "image/jpeg", etag)
+
+@router.get("/{wsi_id}/thumbnail")
+async def get_wsi_thumbnail(
+    wsi_id: int,
+    request: Request,
+    max: int = settings.THUMBNAIL_SIZE,
+    current_user: Optional[User] = Depends(get_tile_access),
+    db: Session = Depends(get_db)
+):
+    """Get a JPEG thumbnail of a WSI file fitting in ``max`` x ``max`` pixels"""
+    slide = _resolve_slide(db, wsi_id)
+    size = clamp_preview_size(max)
+    return await _preview_response(
+        request, make_etag(slide.namespace, "thumbnail", size),
+        get_thumbnail, slide.namespace, slide.file_path, slide.is_flat, size
+    )
+
+@router.get("/{wsi_id}/associated")
+async def list_associated_images(
+    wsi_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """List the associated images (label, macro, ...) of a WSI file"""
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
+    if not wsi_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="WSI file not found"
+        )
+    return {"associated_images": (wsi_file.wsi_metadata or {}).get("associated_images", [])}
+
+@router.get("/{wsi_id}/associated/{name}")
+async def get_associated_image(
+    wsi_id: int,
+    name: str,
+    request: Request,
+    max: int = None,
+    current_user: Optional[User] = Depends(get_tile_access),
+    db: Session = Depends(get_db)
+):
+    """Get an associated image (e.g. ``label`` or ``macro``) of a WSI file as JPEG"""
+    slide = _resolve_slide(db, wsi_id)
+    if slide.is_flat:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Slide has no {name} image"
+        )
+    size = clamp_preview_size(max) if max else None
+    return await _preview_response(
+        request, make_etag(slide.namespace, "associated", name, size),
+        get_associated_preview, slide.namespace, slide.file_path, name, size
+    )
+
+def _tile_version(db: Session, wsi_id: int, v: Optional[str]) -> str:
+    """Content namespace of a slide: the signed ``v`` of the URL, else looked up"""
+    return v or _resolve_slide(db, wsi_id).namespace
+
+def _tile_etag(version: str, *address) -> str:
+    """ETag of a tile, derived from the slide's content rather than its id"""
+    return make_etag("wsi", version, settings.TILE_SIZE, *address)
+
+def _check_version(slide: SlideRef, v: Optional[str]) -> None:
+    """Refuse to render a tile whose signed URL names other slide content"""
+    if v is not None and v != slide.namespace:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Slide content has changed; request a new tile source"
+        )
+
+_DZI_FORMATS = {"jpeg": "jpeg", "jpg": "jpeg", "png": "png"}
+
+def _check_quality(quality: int) -> None:
+    """Reject encoder qualities outside 1-95; each value is a separate cached tile"""
+    if not 1 <= quality <= 95:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="quality must be between 1 and 95"
+        )
+
+def _render_dzi_tile(cache_key, file_path: str, level: int, col: int, row: int, **kwargs) -> bytes:
+    """Render a Deep Zoom tile and store it in the tile cache (runs in the tile pool)"""
+    tile_data = get_dzi_tile(file_path, level, col, row, **kwargs)
+    tile_cache.put(cache_key, tile_data)
+    return tile_data
+
+@router.get("/{wsi_id}_files/{level}/{col}_{row}.{format}")
+async def get_dzi_tile_image(
+    wsi_id: int,
+    level: int,
+    col: int,
+    row: int,
+    format: str,
+    request: Request,
+    quality: int = settings.TILE_JPEG_QUALITY,
+    v: Optional[str] = None,
+    current_user: Optional[User] = Depends(get_tile_access),
+    db: Session = Depends(get_db)
+):
+    """Get a Deep Zoom tile, rendered from the best native pyramid level"""
+    image_format = _DZI_FORMATS.get(format.lower())
+    if image_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported tile format: {format}"
+        )
+    _check_quality(quality)
+    
+    # Revalidation of signed URLs is answered before the slide lookup, cache or renderer
+    etag = _tile_etag(_tile_version(db, wsi_id, v), "dzi", level, col, row, image_format, quality)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    slide = _resolve_slide(db, wsi_id)
+    _check_version(slide, v)
+    cache_key = dzi_tile_key(slide.namespace, level, col, row, image_format, quality)
+    tile_data = tile_cache.get(cache_key)
+    if tile_data is not None:
+        return cached_response(tile_data, f"image/{image_format}", etag)
+    
+    try:
+        if slide.is_flat:
+            # Pre-encoded tiles are already on disk; no need to cache them again
+            tile_data = await tile_executor.run(
+                read_pyramid_tile, slide.namespace, level, col, row,
+                format=image_format, quality=quality
+            )
+        else:
+            tile_data = await tile_executor.run(
+                _render_dzi_tile, cache_key,
+                slide.file_path, level, col, row,
+                tile_size=settings.TILE_SIZE, format=image_format, quality=quality
+            )
+        return cached_response(tile_data, f"image/{image_format}", etag)
+    except ExecutorBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Tile server busy, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting tile: {str(e)}"
+        )
+
+def _render_tile(cache_key, file_path: str, level: int, x: int, y: int, **kwargs) -> bytes:
+    """Render a tile and store it in the tile cache (runs in the tile pool)"""
+    tile_data = get_wsi_tile(file_path, level, x, y, **kwargs)
+    tile_cache.put(cache_key, tile_data)
+    return tile_data
+
 @router.get("/{wsi_id}/tile")
 async def get_tile(
     wsi_id: int,
     level: int,
     x: int,
     y: int,
+    request: Request,
     format: str = "jpeg",
-    current_user: User = Depends(get_current_active_user),
+    quality: int = settings.TILE_JPEG_QUALITY,
+    v: Optional[str] = None,
+    current_user: Optional[User] = Depends(get_tile_access),
     db: Session = Depends(get_db)
 ):
     """Get a tile from a WSI file"""
-    wsi_file = db.query(WSIFile).filter(WSIFile.id == wsi_id).first()
-    if not wsi_file:
+    image_format = _DZI_FORMATS.get(format.lower())
+    if image_format is None:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="WSI file not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported tile format: {format}"
+        )
+    _check_quality(quality)
+    etag = _tile_etag(_tile_version(db, wsi_id, v), "tile", level, x, y, image_format, quality)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    slide = _resolve_slide(db, wsi_id)
+    _check_version(slide, v)
+    if slide.is_flat:
+        manifest = load_manifest(slide.namespace)
+        tile_size = manifest["tile_size"] if manifest else settings.TILE_SIZE
+        if level != 0 or x % tile_size or y % tile_size:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Flat images only serve full-resolution tiles aligned to the tile grid; use the DZI endpoint"
+            )
+        return await get_dzi_tile_image(
+            wsi_id, manifest["levels"] - 1 if manifest else 0, x // tile_size, y // tile_size,
+            image_format, request, quality, v, current_user, db
         )
     
+    cache_key = (slide.namespace, level, x, y, image_format, quality)
+    tile_data = tile_cache.get(cache_key)
+    if tile_data is not None:
+        return cached_response(tile_data, f"image/{image_format}", etag)
+    
     try:
-        tile_data = get_wsi_tile(wsi_file.file_path, level, x, y, format)
-        from fastapi.responses import Response
-        return Response(content=tile_data, media_type=f"image/{format}")
+        tile_data = await tile_executor.run(
+            _render_tile, cache_key,
+            slide.file_path, level, x, y,
+            tile_size=settings.TILE_SIZE, format=image_format, quality=quality
+        )
+        return cached_response(tile_data, f"image/{image_format}", etag)
+    except ExecutorBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Tile server busy, retry shortly",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -216,10 +624,25 @@ async def delete_wsi_file(
             detail="Not authorized to delete this file"
         )
     
-    # Delete file from filesystem
-    if os.path.exists(wsi_file.file_path):
-        os.remove(wsi_file.file_path)
+    slide_registry.invalidate(wsi_id)
+    namespace = slide_namespace(wsi_file)
     
+    content_sha256 = wsi_file.content_sha256
+    orphaned_path = wsi_file.file_path
+    db.query(Job).filter(Job.wsi_file_id == wsi_id).delete(synchronize_session=False)
+    db.query(UploadSession).filter(UploadSession.wsi_file_id == wsi_id).update(
+        {UploadSession.wsi_file_id: None}, synchronize_session=False
+    )
     db.delete(wsi_file)
+    db.flush()
+    
+    # Shared blobs are only removed once the last slide referencing them goes
+    if content_sha256:
+        orphaned_path = release_blob(db, content_sha256)
     db.commit()
+    tile_cache.invalidate(annotation_tile_namespace(wsi_id))
+    export_cache.invalidate(wsi_id)
+    
+    if orphaned_path:
+        _remove_slide_data(orphaned_path, namespace)
     return None
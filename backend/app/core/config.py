@@ -15,6 +15,13 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
+    AUTH_CACHE_TTL_SECONDS: int = 30  # how long a verified token skips the user lookup
+    AUTH_CACHE_MAX_ENTRIES: int = 4096
+    TILE_URL_EXPIRE_MINUTES: int = 60 * 12  # lifetime of signed tile URLs
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt threads; bounds login CPU so tiles keep flowing
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64  # queued hash/verify calls before returning 503
+    LOGIN_MAX_FAILURES: int = 5  # failed logins per username within the window before 429
+    LOGIN_FAILURE_WINDOW_SECONDS: int = 300
     
     # Database
     DATABASE_URL: str = "sqlite:///./annotation_tool.db"
@@ -54,12 +61,45 @@ class Settings(BaseSettings):
     # File Upload
     UPLOAD_DIR: str = "./uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024 * 1024  # 10GB
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024  # 8MB, suggested size for chunked uploads
+    UPLOAD_SESSION_TTL_SECONDS: int = 24 * 60 * 60  # discard chunked uploads left idle this long
     ALLOWED_EXTENSIONS: List[str] = [".svs", ".tiff", ".tif", ".ndpi", ".mrxs", ".jpg", ".jpeg", ".png"]
     
     # WSI Processing
     TILE_SIZE: int = 256
+    THUMBNAIL_SIZE: int = 256  # thumbnail pre-rendered at ingest
+    THUMBNAIL_MAX_SIZE: int = 1024
     MAX_ZOOM_LEVEL: int = 10
     CACHE_DIR: str = "./cache"
+    SLIDE_HANDLE_POOL_SIZE: int = 16  # open OpenSlide handles kept per process
+    SLIDE_HANDLE_IDLE_SECONDS: int = 600  # close handles unused for this long
+    TILE_JPEG_QUALITY: int = 85
+    TILE_CACHE_MEMORY_BYTES: int = 256 * 1024 * 1024  # 256MB
+    TILE_CACHE_DISK_BYTES: int = 10 * 1024 * 1024 * 1024  # 10GB
+    TILE_WORKERS: int = 0  # tile rendering threads; 0 = one per CPU core
+    TILE_QUEUE_LIMIT: int = 256  # queued tile renders before returning 503
+    SLIDE_REGISTRY_TTL_SECONDS: int = 60  # how long tile handlers trust a cached slide lookup
+    MAX_FLAT_IMAGE_PIXELS: int = 2_000_000_000  # largest JPEG/PNG/TIFF we will decode into a pyramid
+    
+    # Annotations
+    ANNOTATION_LOD_TOLERANCE_PX: float = 0.5  # simplification tolerance in screen pixels
+    ANNOTATION_LOD_CACHE_ENTRIES: int = 200_000  # simplified geometries kept in memory
+    ANNOTATION_IMPORT_CHUNK_SIZE: int = 5000  # rows validated and inserted per statement batch
+    ANNOTATION_METRICS_BATCH_SIZE: int = 5000  # annotations re-measured per UPDATE batch
+    
+    # Export
+    EXPORT_BATCH_SIZE: int = 2000  # annotations fetched and encoded per streamed chunk
+    EXPORT_TABLE_BATCH_SIZE: int = 50000  # rows per Arrow record batch / Parquet row group
+    EXPORT_WORKERS: int = 0  # dataset tile rendering processes; 0 = one per CPU core
+    EXPORT_CACHE_BYTES: int = 2 * 1024 * 1024 * 1024  # 2GB of finished exports; 0 disables
+    
+    # Background jobs
+    JOB_WORKERS: int = 2
+    JOB_POLL_SECONDS: float = 2.0  # idle workers re-check the queue this often
+    JOB_STALE_SECONDS: int = 900  # running jobs without a heartbeat for this long are retried
+    JOB_MAX_ATTEMPTS: int = 3
+    INGEST_OVERVIEW_SIZE: int = 1024  # longest side of the image used for tissue detection
+    INGEST_WARM_TILES: int = 256  # low-zoom Deep Zoom tiles pre-rendered after ingest
     
     # AI/ML
     AI_MODEL_PATH: str = "./models"
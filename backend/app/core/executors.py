@@ -0,0 +1,108 @@
+"""
+Bounded thread pools for blocking work called from async handlers
+
+OpenSlide's read_region, Pillow's encoders and bcrypt release the GIL, so
+they scale across cores when they run in worker threads instead of on the
+asyncio event loop. Submissions beyond a pool's queue limit are rejected so
+a burst of requests cannot build an unbounded backlog.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from app.core.config import settings
+
+
+class ExecutorBusy(Exception):
+    """Raised when a pool's queue is full"""
+
+
+class BoundedExecutor:
+    """Thread pool with backpressure and queue-depth counters"""
+
+    def __init__(self, max_workers: int, max_queue: int, name: str):
+        self.name = name
+        self.max_workers = max_workers if max_workers > 0 else (os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._pending = 0  # submitted and not yet finished
+        self._running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.peak_queued = 0
+
+    def _call(self, func: Callable, *args, **kwargs):
+        with self._lock:
+            self._running += 1
+        succeeded = False
+        try:
+            result = func(*args, **kwargs)
+            succeeded = True
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run ``func`` in the pool, raising ExecutorBusy when the queue is full"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.name} queue is full")
+            self._pending += 1
+            self.peak_queued = max(self.peak_queued, self._pending - self._running)
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._call, func, *args, **kwargs)
+        try:
+            future = loop.run_in_executor(self._executor, call)
+        except RuntimeError:
+            # Executor shut down before the call was scheduled
+            with self._lock:
+                self._pending -= 1
+            raise
+        return await future
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+
+tile_executor = BoundedExecutor(
+    max_workers=settings.TILE_WORKERS,
+    max_queue=settings.TILE_QUEUE_LIMIT,
+    name="tile"
+)
+
+# bcrypt spends ~100-300 ms of CPU per call; running it on the event loop
+# would stall every other request, so async handlers use a small pool
+password_executor = BoundedExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_QUEUE_LIMIT,
+    name="password"
+)
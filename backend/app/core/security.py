@@ -2,8 +2,13 @@
 Security utilities for authentication and authorization
 """
 
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional
+import hashlib
+import hmac
+import threading
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -13,9 +18,65 @@ from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
+from app.core.executors import password_executor
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+
+_USER_COLUMNS = [column.name for column in User.__table__.columns]
+
+class UserCache:
+    """Short-lived cache of verified access tokens -> user column values
+    
+    Requests that present a recently seen token get a transient ``User``
+    built from the cached values instead of querying the users table.
+    Entries expire after ``ttl_seconds`` (or with the token, if sooner) and
+    are dropped when the user is changed through the API.
+    """
+    
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            values, expires = entry
+            if expires < time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+        # A fresh instance per request, so handlers cannot leak changes into the cache
+        return User(**values)
+    
+    def put(self, token: str, user: User, token_expires: Optional[float] = None) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        expires = time.time() + self.ttl_seconds
+        if token_expires is not None:
+            expires = min(expires, token_expires)
+        values = {name: getattr(user, name) for name in _USER_COLUMNS}
+        with self._lock:
+            self._entries[token] = (values, expires)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in [t for t, (values, _) in self._entries.items() if values["id"] == user_id]:
+                del self._entries[token]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -25,6 +86,60 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the password pool"""
+    return await password_executor.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the password pool"""
+    return await password_executor.run(get_password_hash, password)
+
+class LoginThrottle:
+    """Per-username sliding window of failed login attempts"""
+    
+    def __init__(self, max_failures: int, window_seconds: float, max_users: int = 10000):
+        self.max_failures = max_failures
+        self.window_seconds = window_seconds
+        self.max_users = max_users
+        self._failures: Dict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _prune(self, username: str, now: float) -> Optional[deque]:
+        failures = self._failures.get(username)
+        if failures is None:
+            return None
+        while failures and failures[0] <= now - self.window_seconds:
+            failures.popleft()
+        if not failures:
+            del self._failures[username]
+            return None
+        return failures
+    
+    def retry_after(self, username: str) -> int:
+        """Seconds until ``username`` may try again, or 0 if not throttled"""
+        now = time.monotonic()
+        with self._lock:
+            failures = self._prune(username, now)
+            if failures is None or len(failures) < self.max_failures:
+                return 0
+            return max(1, int(failures[0] + self.window_seconds - now) + 1)
+    
+    def record_failure(self, username: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            failures = self._prune(username, now)
+            if failures is None:
+                failures = self._failures[username] = deque(maxlen=self.max_failures)
+                while len(self._failures) > self.max_users:
+                    self._failures.popitem(last=False)
+            failures.append(now)
+    
+    def reset(self, username: str) -> None:
+        with self._lock:
+            self._failures.pop(username, None)
+
+login_throttle = LoginThrottle(settings.LOGIN_MAX_FAILURES, settings.LOGIN_FAILURE_WINDOW_SECONDS)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -46,6 +161,10 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    user = user_cache.get(token)
+    if user is not None:
+        return user
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
@@ -57,6 +176,7 @@ async def get_current_user(
     user = db.query(User).filter(User.username == username).first()
     if user is None:
         raise credentials_exception
+    user_cache.put(token, user, token_expires=payload.get("exp"))
     return user
 
 async def get_current_active_user(
@@ -77,3 +197,51 @@ def require_role(required_role: str):
             )
         return current_user
     return role_checker
+
+def _tile_signature(wsi_id: int, version: str, expires: int) -> str:
+    message = f"tiles:{wsi_id}:{version}:{expires}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+def sign_tile_access(wsi_id: int, version: str) -> dict:
+    """Query parameters granting expiring access to the tiles and previews of a slide
+    
+    ``version`` is the slide's content namespace; signing it lets tile
+    requests derive content-based ETags without a lookup. The expiry is
+    rounded up to the hour so repeated calls yield the same URLs and
+    browsers keep reusing their cached tiles.
+    """
+    expires = int(time.time()) + settings.TILE_URL_EXPIRE_MINUTES * 60
+    expires += -expires % 3600
+    return {"v": version, "exp": expires, "sig": _tile_signature(wsi_id, version, expires)}
+
+def verify_tile_access(wsi_id: int, version: str, expires: int, signature: str) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_tile_signature(wsi_id, version, expires), signature)
+
+async def get_tile_access(
+    wsi_id: int,
+    v: Optional[str] = None,
+    exp: Optional[int] = None,
+    sig: Optional[str] = None,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[User]:
+    """Authorize a slide image request by signed URL, or else by bearer token
+    
+    Signed requests need no database access and resolve to no user.
+    """
+    if sig is not None:
+        if v is None or exp is None or not verify_tile_access(wsi_id, v, exp, sig):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invalid or expired tile signature"
+            )
+        return None
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_current_active_user(await get_current_user(token, db))
@@ -3,8 +3,10 @@ Database models
 """
 
 from app.models.user import User, UserRole
-from app.models.wsi import WSIFile
+from app.models.wsi import WSIFile, SlideBlob
 from app.models.annotation import Annotation
 from app.models.label_schema import LabelSchema
+from app.models.upload import UploadSession
+from app.models.job import Job
 
-__all__ = ["User", "UserRole", "WSIFile", "Annotation", "LabelSchema"]
+__all__ = ["User", "UserRole", "WSIFile", "SlideBlob", "Annotation", "LabelSchema", "UploadSession", "Job"]
@@ -2,14 +2,20 @@
 Annotation model
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Boolean, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Boolean, Text, Index, LargeBinary
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 
 from app.core.database import Base
 
 class Annotation(Base):
     __tablename__ = "annotations"
+    __table_args__ = (
+        # Viewport queries: one slide, then a range on the bounding box
+        Index("ix_annotations_wsi_bbox", "wsi_file_id", "bbox_min_x", "bbox_max_x", "bbox_min_y", "bbox_max_y"),
+        # Delta sync: one slide, then changes in (revision, id) order
+        Index("ix_annotations_wsi_revision", "wsi_file_id", "revision", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     
@@ -18,8 +24,10 @@ class Annotation(Base):
     wsi_file = relationship("WSIFile", back_populates="annotations")
     
     # Annotation geometry (GeoJSON format)
-    geometry = Column(JSON, nullable=False)  # GeoJSON geometry object
+    # Deferred: only responses that return full-resolution GeoJSON load it (undefer)
+    geometry = deferred(Column(JSON, nullable=False))  # GeoJSON geometry object
     geometry_type = Column(String, nullable=False)  # Polygon, Point, LineString, etc.
+    geometry_wkb = Column(LargeBinary, nullable=True)  # WKB copy of geometry, decoded without JSON parsing
     
     # Annotation properties
     label = Column(String, nullable=False)  # Class label
@@ -44,8 +52,15 @@ class Annotation(Base):
     centroid_x = Column(Float, nullable=True)
     centroid_y = Column(Float, nullable=True)
     
+    # Bounding box in level-0 pixels, for viewport queries
+    bbox_min_x = Column(Float, nullable=True)
+    bbox_min_y = Column(Float, nullable=True)
+    bbox_max_x = Column(Float, nullable=True)
+    bbox_max_y = Column(Float, nullable=True)
+    
     # Versioning and audit
     version = Column(Integer, default=1)
+    revision = Column(Integer, nullable=True)  # slide annotation revision of the last change; NULL before delta sync
     parent_annotation_id = Column(Integer, ForeignKey("annotations.id"), nullable=True)
     parent_annotation = relationship("Annotation", remote_side=[id], backref="versions")
     
@@ -0,0 +1,34 @@
+"""
+Background job model
+"""
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Text
+from datetime import datetime
+
+from app.core.database import Base
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False, index=True)  # ingest, ...
+    wsi_file_id = Column(Integer, ForeignKey("wsi_files.id"), nullable=True, index=True)
+    payload = Column(JSON, nullable=True)  # handler arguments
+    result = Column(JSON, nullable=True)
+    
+    # Progress
+    status = Column(String, default="pending", index=True)  # pending, running, completed, error
+    progress = Column(Float, default=0.0)  # 0.0 - 1.0
+    stage = Column(String, nullable=True)  # current step, e.g. "metadata"
+    message = Column(Text, nullable=True)  # error message
+    attempts = Column(Integer, default=0)
+    worker = Column(String, nullable=True)  # worker that claimed the job
+    
+    # Creator
+    creator_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    
+    # Timestamps (updated_at doubles as the worker heartbeat)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
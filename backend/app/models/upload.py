@@ -0,0 +1,32 @@
+"""
+Chunked upload session model
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, JSON
+from datetime import datetime
+
+from app.core.database import Base
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True, index=True)  # opaque upload id
+    original_filename = Column(String, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    
+    # Byte ranges written so far, merged: [[start, end), ...]
+    received_ranges = Column(JSON, default=list)
+    received_bytes = Column(BigInteger, default=0)
+    sha256 = Column(String, nullable=True)  # set when the upload completes
+    
+    # Study information passed through to the WSI record
+    study_instance_uid = Column(String, nullable=True)
+    patient_id = Column(String, nullable=True)
+    
+    status = Column(String, default="uploading")  # uploading, completing, completed
+    wsi_file_id = Column(Integer, ForeignKey("wsi_files.id", ondelete="SET NULL"), nullable=True)
+    uploader_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -2,14 +2,26 @@
 WSI file model
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, JSON, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from app.core.database import Base
 
+class SlideBlob(Base):
+    """Content-addressed slide file shared by every WSIFile with the same bytes"""
+    __tablename__ = "slide_blobs"
+
+    sha256 = Column(String, primary_key=True)
+    file_path = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class WSIFile(Base):
     __tablename__ = "wsi_files"
+    # Never reuse ids of deleted slides; cached slide lookups are keyed by id
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
@@ -17,6 +29,7 @@ class WSIFile(Base):
     file_path = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
     file_format = Column(String, nullable=False)  # .svs, .tiff, etc.
+    content_sha256 = Column(String, ForeignKey("slide_blobs.sha256"), nullable=True, index=True)
     
     # WSI metadata
     width = Column(Integer, nullable=True)
@@ -35,6 +48,7 @@ class WSIFile(Base):
     # Status
     is_processed = Column(Boolean, default=False)
     processing_status = Column(String, default="pending")  # pending, processing, completed, error
+    annotation_revision = Column(Integer, default=0)  # bumped on every annotation change
     
     # Relationships
     uploader_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -12,6 +12,8 @@ from app.schemas.label_schema import (
     LabelClass, LabelSchemaBase, LabelSchemaCreate, 
     LabelSchemaUpdate, LabelSchemaResponse
 )
+from app.schemas.upload import UploadInit, UploadComplete, UploadSessionResponse
+from app.schemas.job import JobResponse
 
 __all__ = [
     "UserBase", "UserCreate", "UserUpdate", "UserResponse",
@@ -19,5 +21,7 @@ __all__ = [
     "AnnotationBase", "AnnotationCreate", "AnnotationUpdate", 
     "AnnotationResponse", "AnnotationBatchCreate",
     "LabelClass", "LabelSchemaBase", "LabelSchemaCreate",
-    "LabelSchemaUpdate", "LabelSchemaResponse"
+    "LabelSchemaUpdate", "LabelSchemaResponse",
+    "UploadInit", "UploadComplete", "UploadSessionResponse",
+    "JobResponse"
 ]
@@ -59,3 +59,34 @@ class AnnotationResponse(AnnotationBase):
 class AnnotationBatchCreate(BaseModel):
     wsi_file_id: int
     annotations: List[AnnotationCreate]
+
+class AnnotationImportProperties(BaseModel):
+    """Annotation fields read from the properties of an imported feature"""
+    label: str
+    label_hierarchy: Optional[List[str]] = None
+    color: Optional[str] = None
+    opacity: float = 0.7
+    description: Optional[str] = None
+    layer_name: str = "default"
+    is_locked: bool = False
+    is_visible: bool = True
+    confidence: Optional[float] = None
+    is_ai_generated: bool = False
+    ai_model_version: Optional[str] = None
+
+class AnnotationImportError(BaseModel):
+    index: int  # position of the record in the upload
+    detail: str
+
+class AnnotationImportResult(BaseModel):
+    imported: int
+    rejected: int
+    errors: List[AnnotationImportError]  # first rejections only
+    seconds: float
+    annotations_per_second: float
+
+class AnnotationChanges(BaseModel):
+    annotations: List[AnnotationResponse]  # created or updated since the cursor
+    deleted: List[int]  # ids soft-deleted since the cursor
+    cursor: str  # ``revision`` or ``revision,id``; pass back as ``since`` on the next poll
+    has_more: bool
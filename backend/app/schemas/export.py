@@ -0,0 +1,15 @@
+"""
+Export schemas
+"""
+
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+class CohortExportRequest(BaseModel):
+    """Slides of a cohort export: explicit ids, or every slide matching the filters"""
+    wsi_ids: Optional[List[int]] = Field(None, min_length=1)
+    patient_id: Optional[str] = None
+    study_instance_uid: Optional[str] = None
+    label: Optional[str] = None  # slides with at least one annotation of this label
+    format: Literal["geojson", "coco", "parquet", "arrow"] = "geojson"
+    pretty: bool = False
@@ -0,0 +1,25 @@
+"""
+Background job schemas
+"""
+
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+from datetime import datetime
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    wsi_file_id: Optional[int] = None
+    status: str
+    progress: float
+    stage: Optional[str] = None
+    message: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,32 @@
+"""
+Chunked upload schemas
+"""
+
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+class UploadInit(BaseModel):
+    filename: str
+    size: int
+    study_instance_uid: Optional[str] = None
+    patient_id: Optional[str] = None
+
+class UploadComplete(BaseModel):
+    sha256: Optional[str] = None  # optional client-side checksum to verify
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    original_filename: str
+    total_size: int
+    received_ranges: List[List[int]]
+    received_bytes: int
+    sha256: Optional[str] = None
+    status: str
+    wsi_file_id: Optional[int] = None
+    chunk_size: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -18,6 +18,14 @@ class WSIFileCreate(WSIFileBase):
     patient_id: Optional[str] = None
     study_date: Optional[datetime] = None
 
+class WSIFileUpdate(BaseModel):
+    mpp_x: Optional[float] = None
+    mpp_y: Optional[float] = None
+    magnification: Optional[float] = None
+    study_instance_uid: Optional[str] = None
+    patient_id: Optional[str] = None
+    study_date: Optional[datetime] = None
+
 class WSIFileResponse(WSIFileBase):
     id: int
     file_path: str
@@ -0,0 +1,240 @@
+"""
+Streaming annotation exports
+
+Exports are generators of encoded chunks. Rows are read from a
+``yield_per`` cursor a batch at a time and each batch is encoded and handed
+to the response before the next one is fetched, so memory use does not
+grow with the number of annotations and the first bytes go out
+immediately.
+
+GeoJSON geometry is copied into the output as the stored JSON text without
+being decoded; COCO segmentations are read from the WKB copy of the
+geometry with the Shapely array functions. orjson is used for encoding
+when it is installed.
+"""
+
+import csv
+import io
+import json
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import shapely
+from sqlalchemy import Text, cast
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.annotation import Annotation
+from app.utils.geometry_metrics import stored_geometries
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def dumps(obj, pretty: bool = False) -> bytes:
+    """Encode to JSON bytes, compact unless ``pretty``"""
+    if pretty:
+        return json.dumps(obj, indent=2).encode()
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def _batches(query, size: Optional[int] = None) -> Iterator[list]:
+    """Rows of a query in id-ordered lists of ``size`` (default EXPORT_BATCH_SIZE)"""
+    size = size or settings.EXPORT_BATCH_SIZE
+    batch = []
+    for row in query.order_by(Annotation.id).yield_per(size):
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _live_annotations(db, wsi_id: int, *columns):
+    return db.query(*columns).filter(
+        Annotation.wsi_file_id == wsi_id,
+        Annotation.deleted_at.is_(None)
+    )
+
+
+def polygon_segmentations(geometries: np.ndarray) -> List[list]:
+    """COCO segmentation (flat ring coordinate lists) of each polygon; [] for other types"""
+    segmentations = [[] for _ in range(len(geometries))]
+    polygons = np.flatnonzero(
+        (shapely.get_type_id(geometries) == shapely.GeometryType.POLYGON) & ~shapely.is_empty(geometries)
+    )
+    if not len(polygons):
+        return segmentations
+    rings, owners = shapely.get_rings(geometries[polygons], return_index=True)
+    coords = shapely.get_coordinates(rings)
+    ends = np.cumsum(shapely.get_num_coordinates(rings))
+    start = 0
+    for owner, end in zip(owners, ends):
+        segmentations[polygons[owner]].append(coords[start:end].ravel().tolist())
+        start = end
+    return segmentations
+
+
+COCO_COLUMNS = (
+    Annotation.id, Annotation.label, Annotation.label_hierarchy, Annotation.area_um2,
+    Annotation.geometry_wkb, Annotation.bbox_min_x, Annotation.bbox_min_y,
+    Annotation.bbox_max_x, Annotation.bbox_max_y
+)
+GEOJSON_COLUMNS = (
+    cast(Annotation.geometry, Text).label("geometry_json"),
+    Annotation.id, Annotation.label, Annotation.label_hierarchy, Annotation.color,
+    Annotation.opacity, Annotation.description, Annotation.confidence,
+    Annotation.is_ai_generated, Annotation.layer_name, Annotation.area_um2,
+    Annotation.perimeter_um, Annotation.creator_id, Annotation.created_at, Annotation.updated_at
+)
+
+
+def coco_document(batches: Iterable[list], file_name: str, width: int, height: int,
+                  pretty: bool = False) -> Iterator[bytes]:
+    """Encode batches of ``COCO_COLUMNS`` rows of one slide as a COCO document
+
+    Categories are collected while annotations stream and written last.
+    """
+    info = {"description": f"Annotations for {file_name}", "version": "1.0"}
+    images = [{"id": 1, "width": width or 0, "height": height or 0, "file_name": file_name}]
+    yield b'{"info":' + dumps(info, pretty) + b',"images":' + dumps(images, pretty) + b',"annotations":['
+
+    categories = {}
+    separator = b""
+    for batch in batches:
+        segmentations = polygon_segmentations(stored_geometries(batch))
+        encoded = []
+        for row, segmentation in zip(batch, segmentations):
+            if row.label not in categories:
+                categories[row.label] = {
+                    "id": len(categories) + 1,
+                    "name": row.label,
+                    "supercategory": row.label_hierarchy[0] if row.label_hierarchy else "none"
+                }
+            if row.bbox_min_x is None:
+                bbox = []
+            else:
+                bbox = [row.bbox_min_x, row.bbox_min_y,
+                        row.bbox_max_x - row.bbox_min_x, row.bbox_max_y - row.bbox_min_y]
+            encoded.append(dumps({
+                "id": row.id,
+                "image_id": 1,
+                "category_id": categories[row.label]["id"],
+                "segmentation": segmentation,
+                "area": row.area_um2 or 0,
+                "bbox": bbox,
+                "iscrowd": 0
+            }, pretty))
+        yield separator + b",".join(encoded)
+        separator = b","
+
+    yield b'],"categories":' + dumps(list(categories.values()), pretty) + b"}"
+
+
+def geojson_document(batches: Iterable[list], pretty: bool = False) -> Iterator[bytes]:
+    """Encode batches of ``GEOJSON_COLUMNS`` rows of one slide as a GeoJSON FeatureCollection"""
+    yield b'{"type":"FeatureCollection","features":['
+    separator = b""
+    for batch in batches:
+        encoded = []
+        for row in batch:
+            properties = {
+                "id": row.id,
+                "label": row.label,
+                "label_hierarchy": row.label_hierarchy,
+                "color": row.color,
+                "opacity": row.opacity,
+                "description": row.description,
+                "confidence": row.confidence,
+                "is_ai_generated": row.is_ai_generated,
+                "layer_name": row.layer_name,
+                "area_um2": row.area_um2,
+                "perimeter_um": row.perimeter_um,
+                "creator_id": row.creator_id,
+                "created_at": row.created_at.isoformat(),
+                "updated_at": row.updated_at.isoformat()
+            }
+            encoded.append(
+                b'{"type":"Feature","geometry":' + row.geometry_json.encode()
+                + b',"properties":' + dumps(properties, pretty) + b"}"
+            )
+        yield separator + b",".join(encoded)
+        separator = b","
+    yield b"]}"
+
+
+def coco_export(wsi_id: int, file_name: str, width: int, height: int,
+                pretty: bool = False) -> Iterator[bytes]:
+    """Stream the annotations of a slide as a COCO document"""
+    # The request session may be closed before the response finishes streaming
+    db = SessionLocal()
+    try:
+        query = _live_annotations(db, wsi_id, *COCO_COLUMNS)
+        yield from coco_document(_batches(query), file_name, width, height, pretty)
+    finally:
+        db.close()
+
+
+def geojson_export(wsi_id: int, pretty: bool = False) -> Iterator[bytes]:
+    """Stream the annotations of a slide as a GeoJSON FeatureCollection"""
+    db = SessionLocal()
+    try:
+        query = _live_annotations(db, wsi_id, *GEOJSON_COLUMNS)
+        yield from geojson_document(_batches(query), pretty)
+    finally:
+        db.close()
+
+
+CSV_HEADER = [
+    "ID", "Label", "Label Hierarchy", "Geometry Type",
+    "Area (µm²)", "Perimeter (µm)", "Centroid X", "Centroid Y",
+    "Confidence", "AI Generated", "Layer", "Description",
+    "Creator ID", "Created At", "Updated At"
+]
+
+
+def csv_export(wsi_id: int) -> Iterator[bytes]:
+    """Stream a CSV summary of the annotations of a slide"""
+    db = SessionLocal()
+    try:
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(CSV_HEADER)
+        query = _live_annotations(
+            db, wsi_id,
+            Annotation.id, Annotation.label, Annotation.label_hierarchy, Annotation.geometry_type,
+            Annotation.area_um2, Annotation.perimeter_um, Annotation.centroid_x, Annotation.centroid_y,
+            Annotation.confidence, Annotation.is_ai_generated, Annotation.layer_name,
+            Annotation.description, Annotation.creator_id, Annotation.created_at, Annotation.updated_at
+        )
+        for batch in _batches(query):
+            writer.writerows([
+                row.id,
+                row.label,
+                " > ".join(row.label_hierarchy) if row.label_hierarchy else "",
+                row.geometry_type,
+                row.area_um2 or "",
+                row.perimeter_um or "",
+                row.centroid_x or "",
+                row.centroid_y or "",
+                row.confidence or "",
+                row.is_ai_generated,
+                row.layer_name,
+                row.description or "",
+                row.creator_id,
+                row.created_at.isoformat(),
+                row.updated_at.isoformat()
+            ] for row in batch)
+            yield output.getvalue().encode()
+            output.seek(0)
+            output.truncate()
+        if output.tell():
+            yield output.getvalue().encode()
+    finally:
+        db.close()
@@ -0,0 +1,237 @@
+"""
+Bulk annotation import
+
+AI pipelines produce tens of thousands of cell outlines per slide. Imported
+records are validated and measured a chunk at a time with the vectorized
+geometry metrics and spooled to a temporary file while the body arrives.
+Once it has been read in full they are written in one short transaction,
+one multi-row INSERT per chunk, instead of one ORM object, flush and
+refresh per annotation; no transaction stays open while a client uploads.
+"""
+
+import json
+import pickle
+import tempfile
+import time
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import shapely
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import Text, bindparam, insert
+from sqlalchemy.orm import Session
+
+from app.core.database import json_serializer
+from app.models.annotation import Annotation
+from app.models.wsi import WSIFile
+from app.schemas.annotation import AnnotationImportProperties
+from app.utils.annotation_revision import bump_annotation_revision
+from app.utils.geometry_metrics import METRIC_COLUMNS, geometries_from_geojson, geometries_to_wkb, annotation_metrics
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+IMPORT_ERROR_LIMIT = 100  # rejections listed in the import report
+
+# Properties of a whole chunk are validated and dumped in one call into pydantic-core
+_properties_adapter = TypeAdapter(List[AnnotationImportProperties])
+
+
+class ImportReport:
+    """Counts and first errors of a running import"""
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self._started = time.perf_counter()
+
+    def reject(self, index: int, detail: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < IMPORT_ERROR_LIMIT:
+            self.errors.append({"index": index, "detail": detail})
+
+    def as_dict(self) -> dict:
+        seconds = time.perf_counter() - self._started
+        return {
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "annotations_per_second": round(self.imported / seconds, 1) if seconds > 0 else 0.0,
+        }
+
+
+def _record_fields(record: dict):
+    """Geometry and properties of a GeoJSON Feature or of a plain annotation object"""
+    if record.get("type") == "Feature":
+        properties = dict(record.get("properties") or {})
+    else:
+        properties = dict(record)
+    if "label" not in properties and isinstance(properties.get("classification"), dict):
+        # QuPath exports carry the class in properties.classification.name
+        properties["label"] = properties["classification"].get("name")
+    return record.get("geometry"), properties
+
+
+def _validate_properties(indexes: list, properties: list, geometries: list, report: ImportReport):
+    """Validate the properties of a chunk at once; rejected records are dropped from all three lists"""
+    while properties:
+        try:
+            fields = _properties_adapter.validate_python(properties)
+            return indexes, _properties_adapter.dump_python(fields), geometries
+        except ValidationError as e:
+            failed = {}
+            for error in e.errors():
+                # The first location item is the position in the chunk
+                failed.setdefault(error["loc"][0], error)
+        for position, error in sorted(failed.items()):
+            report.reject(indexes[position], f"{'.'.join(str(p) for p in error['loc'][1:])}: {error['msg']}")
+        keep = [i for i in range(len(properties)) if i not in failed]
+        indexes = [indexes[i] for i in keep]
+        properties = [properties[i] for i in keep]
+        geometries = [geometries[i] for i in keep]
+    return [], [], []
+
+
+def parse_records(records: Iterable, first_index: int, overrides: dict, report: ImportReport):
+    """Validate raw records; returns the column values and Shapely geometries of the valid ones
+
+    Records are dicts or undecoded JSON lines. Records without a label or
+    with a missing, empty or topologically invalid geometry are rejected.
+    """
+    indexes, properties_list, geometries = [], [], []
+    for index, record in enumerate(records, first_index):
+        if isinstance(record, (bytes, str)):
+            try:
+                record = loads(record)
+            except ValueError:
+                report.reject(index, "Invalid JSON")
+                continue
+        if not isinstance(record, dict):
+            report.reject(index, "Expected a GeoJSON Feature or an annotation object")
+            continue
+        geometry, properties = _record_fields(record)
+        if not isinstance(geometry, dict) or not isinstance(geometry.get("type"), str):
+            report.reject(index, "Missing geometry")
+            continue
+        properties.update(overrides)
+        indexes.append(index)
+        properties_list.append(properties)
+        geometries.append(geometry)
+
+    indexes, fields, geometries = _validate_properties(indexes, properties_list, geometries, report)
+    values = [
+        dict(row, geometry=geometry, geometry_type=geometry["type"])
+        for row, geometry in zip(fields, geometries)
+    ]
+
+    shapes = geometries_from_geojson(geometries)
+    parsed = ~shapely.is_missing(shapes) & ~shapely.is_empty(shapes)
+    valid = parsed & shapely.is_valid(shapes)
+    if valid.all():
+        return values, shapes
+    for i in np.flatnonzero(~valid):
+        if not parsed[i]:
+            report.reject(indexes[i], "Geometry could not be parsed or is empty")
+        else:
+            report.reject(indexes[i], f"Invalid geometry: {shapely.is_valid_reason(shapes[i])}")
+    return [v for v, ok in zip(values, valid) if ok], shapes[valid]
+
+
+def build_rows(values: List[dict], shapes: np.ndarray, wsi_file: WSIFile, creator_id: int) -> List[dict]:
+    """Insert parameters of annotations with their metrics computed in one pass
+
+    JSON columns are encoded here rather than by the driver, so the rows
+    are cheap to spool and the insert itself only binds text.
+    """
+    metrics = annotation_metrics(shapes, wsi_file.mpp_x, wsi_file.mpp_y)
+    wkb = geometries_to_wkb(shapes)
+    rows = []
+    for i, row in enumerate(values):
+        label_hierarchy = row.get("label_hierarchy")
+        row = dict(
+            row, wsi_file_id=wsi_file.id, creator_id=creator_id, geometry_wkb=wkb[i],
+            geometry=json_serializer(row["geometry"]),
+            label_hierarchy=None if label_hierarchy is None else json_serializer(label_hierarchy)
+        )
+        for column in METRIC_COLUMNS:
+            row[column] = metrics[column][i]
+        rows.append(row)
+    return rows
+
+
+# Core INSERT binding the JSON columns encoded by build_rows as text
+_insert = insert(Annotation.__table__).values(
+    geometry=bindparam("geometry", type_=Text()),
+    label_hierarchy=bindparam("label_hierarchy", type_=Text()),
+)
+
+
+def insert_rows(db: Session, rows: List[dict], revision: int, returning: bool = False) -> Optional[List[int]]:
+    """Insert rows from ``build_rows`` stamped with ``revision`` with executemany
+
+    Optionally returns their ids in order.
+    """
+    if not rows:
+        return [] if returning else None
+    for row in rows:
+        row["revision"] = revision
+    if returning:
+        return db.scalars(
+            _insert.returning(Annotation.id, sort_by_parameter_order=True), rows
+        ).all()
+    db.execute(_insert, rows)
+    return None
+
+
+class RowSpool:
+    """Validated rows of an import, kept in a temporary file until they are inserted
+
+    Chunks are pickled as they are validated, so an import of any size is
+    held on disk rather than in memory while the rest of its body arrives.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._chunks = 0
+
+    def add(self, rows: List[dict]) -> None:
+        if rows:
+            pickle.dump(rows, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._chunks += 1
+
+    def __iter__(self) -> Iterator[List[dict]]:
+        self._file.seek(0)
+        for _ in range(self._chunks):
+            yield pickle.load(self._file)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def spool_chunk(spool: RowSpool, records: list, first_index: int, wsi_file: WSIFile,
+                creator_id: int, overrides: dict, report: ImportReport) -> None:
+    """Validate and measure one chunk of an import and spool its rows"""
+    values, shapes = parse_records(records, first_index, overrides, report)
+    spool.add(build_rows(values, shapes, wsi_file, creator_id))
+    report.imported += len(values)
+
+
+def insert_spooled(db: Session, spool: RowSpool, wsi_id: int) -> Optional[int]:
+    """Insert every spooled row under a new annotation revision and commit
+
+    Returns the revision, or None without writing anything when the slide
+    no longer exists.
+    """
+    revision = bump_annotation_revision(db, wsi_id)
+    if revision is None:
+        db.rollback()
+        return None
+    for rows in spool:
+        insert_rows(db, rows, revision)
+    db.commit()
+    return revision
@@ -0,0 +1,45 @@
+"""
+Per-slide annotation revision
+
+Every change to the annotations of a slide bumps
+``WSIFile.annotation_revision`` in the same transaction. Artifacts derived
+from the annotations, such as vector tiles and exports, are keyed by the
+revision so a stale one is never served, and each changed annotation is
+stamped with it so clients can sync the changes after a revision.
+"""
+
+from typing import Optional
+
+from sqlalchemy import update, func
+from sqlalchemy.orm import Session
+
+from app.models.wsi import WSIFile
+from app.utils.export_cache import export_cache
+from app.utils.tile_cache import tile_cache
+
+
+def annotation_tile_namespace(wsi_id: int) -> str:
+    """Tile cache namespace of the annotation tiles of a slide"""
+    return f"annotations-{wsi_id}"
+
+
+def bump_annotation_revision(db: Session, wsi_id: int) -> Optional[int]:
+    """Bump the annotation revision of a slide, committed with the caller's changes
+
+    Returns the new revision, which the caller stamps on the annotations it
+    changes. Call it before writing them: the bump locks the slide row until
+    commit, so revisions of a slide are committed in increasing order.
+    """
+    revision = db.execute(
+        update(WSIFile)
+        .where(WSIFile.id == wsi_id)
+        .values(
+            annotation_revision=func.coalesce(WSIFile.annotation_revision, 0) + 1,
+            updated_at=WSIFile.updated_at
+        )
+        .returning(WSIFile.annotation_revision)
+    ).scalar()
+    # Tiles and exports of older revisions are never served again; free their space now
+    tile_cache.invalidate(annotation_tile_namespace(wsi_id))
+    export_cache.invalidate(wsi_id)
+    return revision
@@ -0,0 +1,82 @@
+"""
+Content-addressed storage for slide files
+
+Uploads are stored once per distinct SHA-256 under ``UPLOAD_DIR/blobs`` and
+reference counted, so identical slides uploaded by several users share one
+file and one set of cached tiles.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.wsi import SlideBlob
+
+
+def blob_path(sha256: str, file_ext: str) -> Path:
+    """Location of a blob; the extension is kept so OpenSlide can detect the format"""
+    return Path(settings.UPLOAD_DIR) / "blobs" / sha256[:2] / f"{sha256}{file_ext}"
+
+
+def store_blob(db: Session, tmp_path: Path, sha256: str, file_ext: str) -> SlideBlob:
+    """Move ``tmp_path`` into the blob store and take a reference to it
+
+    If a blob with the same digest exists the temporary file is discarded.
+    The caller commits the session.
+    """
+    blob = db.query(SlideBlob).filter(SlideBlob.sha256 == sha256).first()
+    if blob is None:
+        path = blob_path(sha256, file_ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        blob = SlideBlob(
+            sha256=sha256,
+            file_path=str(path),
+            file_size=path.stat().st_size,
+            ref_count=1
+        )
+        db.add(blob)
+        try:
+            db.flush()
+            return blob
+        except IntegrityError:
+            # Another upload of the same bytes registered the blob first
+            db.rollback()
+            blob = db.query(SlideBlob).filter(SlideBlob.sha256 == sha256).one()
+    elif os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    db.execute(
+        update(SlideBlob)
+        .where(SlideBlob.sha256 == sha256)
+        .values(ref_count=SlideBlob.ref_count + 1)
+    )
+    db.refresh(blob)
+    return blob
+
+
+def release_blob(db: Session, sha256: str) -> Optional[str]:
+    """Drop a reference; return the blob's path if it has no references left
+
+    The row of an unreferenced blob is deleted, the file is left to the
+    caller so it can release open handles and caches first.
+    """
+    db.execute(
+        update(SlideBlob)
+        .where(SlideBlob.sha256 == sha256)
+        .values(ref_count=SlideBlob.ref_count - 1)
+    )
+    blob = db.query(SlideBlob).filter(SlideBlob.sha256 == sha256).first()
+    if blob is None:
+        return None
+    db.refresh(blob)
+    if blob.ref_count > 0:
+        return None
+    path = blob.file_path
+    db.delete(blob)
+    return path
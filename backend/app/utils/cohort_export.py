@@ -0,0 +1,142 @@
+"""
+Multi-slide cohort export, run as a ``cohort_export`` background job
+
+The annotations of a chunk of slides are read with one query, and each
+slide is serialized to its own COCO, GeoJSON, Parquet or Arrow document
+in a process pool while the next chunk is fetched. Finished documents are
+staged as files under ``CACHE_DIR/exports/cohort-<job id>/``, so a job
+that is retried after its worker died only serializes the slides still
+missing. The staged documents are packed into one ZIP archive with a
+manifest at the end.
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.annotation import Annotation
+from app.models.job import Job
+from app.models.wsi import WSIFile
+from app.utils.annotation_export import COCO_COLUMNS, GEOJSON_COLUMNS, coco_document, geojson_document
+from app.utils.dataset_export import export_dir, export_workers
+from app.utils.job_queue import job_queue
+from app.utils.table_export import TABLE_COLUMNS, TABLE_FORMATS, write_table_file
+
+EXTENSIONS = {"geojson": "geojson", "coco": "json", "parquet": "parquet", "arrow": "arrow"}
+
+
+def document_name(slide, fmt: str) -> str:
+    """Archive member name of a slide: ``<id>_<file stem>.<ext>``"""
+    stem = Path(slide.original_filename or "slide").stem
+    return f"{slide.id}_{stem}.{EXTENSIONS[fmt]}"
+
+
+def write_slide_document(path: str, fmt: str, slide: dict, rows: list, pretty: bool) -> int:
+    """Serialize the annotations of one slide to a staged file (runs in the process pool)"""
+    partial = path + ".tmp"
+    if fmt in TABLE_FORMATS:
+        write_table_file(partial, fmt, rows)
+        os.replace(partial, path)
+        return len(rows)
+    batches = [rows] if rows else []
+    if fmt == "coco":
+        chunks = coco_document(batches, slide["file_name"], slide["width"], slide["height"], pretty)
+    else:
+        chunks = geojson_document(batches, pretty)
+    with open(partial, "wb") as output:
+        for chunk in chunks:
+            output.write(chunk)
+    os.replace(partial, path)
+    return len(rows)
+
+
+def _chunk_rows(db: Session, slide_ids: List[int], columns: tuple) -> dict:
+    """Live annotations of several slides from one query, grouped by slide"""
+    rows = {slide_id: [] for slide_id in slide_ids}
+    query = db.query(Annotation.wsi_file_id, *columns).filter(
+        Annotation.wsi_file_id.in_(slide_ids),
+        Annotation.deleted_at.is_(None)
+    ).order_by(Annotation.wsi_file_id, Annotation.id)
+    for row in query:
+        rows[row.wsi_file_id].append(row)
+    return rows
+
+
+@job_queue.handler("cohort_export")
+def export_cohort(db: Session, job: Job, report: Callable[[float, Optional[str]], None]) -> dict:
+    """Serialize the annotations of every slide of a cohort into one ZIP"""
+    payload = job.payload or {}
+    fmt = payload.get("format", "geojson")
+    pretty = payload.get("pretty", False)
+    columns = {"coco": COCO_COLUMNS, "geojson": GEOJSON_COLUMNS}.get(fmt, TABLE_COLUMNS)
+    slides = db.query(
+        WSIFile.id, WSIFile.original_filename, WSIFile.width, WSIFile.height,
+        WSIFile.patient_id, WSIFile.study_instance_uid
+    ).filter(WSIFile.id.in_(payload.get("wsi_ids") or [])).order_by(WSIFile.id).all()
+
+    staging = export_dir() / f"cohort-{job.id}"
+    staging.mkdir(parents=True, exist_ok=True)
+    documents = {slide.id: staging / document_name(slide, fmt) for slide in slides}
+    # Documents staged by an interrupted attempt of this job are kept
+    remaining = [slide for slide in slides if not documents[slide.id].exists()]
+    done = len(slides) - len(remaining)
+    report(done / max(len(slides), 1) * 0.95, "serializing")
+
+    workers = export_workers()
+    # Spawned workers do not inherit open database connections or the job threads
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = set()
+
+        def collect(limit: int) -> None:
+            nonlocal pending, done
+            while len(pending) > limit:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                    done += 1
+                report(done / max(len(slides), 1) * 0.95)
+
+        for start in range(0, len(remaining), workers):
+            chunk = remaining[start:start + workers]
+            rows = _chunk_rows(db, [slide.id for slide in chunk], columns)
+            for slide in chunk:
+                info = {"file_name": slide.original_filename, "width": slide.width, "height": slide.height}
+                pending.add(pool.submit(
+                    write_slide_document, str(documents[slide.id]), fmt, info, rows.pop(slide.id), pretty
+                ))
+            # Fetch the next chunk while at most one chunk is still being serialized
+            collect(workers)
+        collect(0)
+
+    report(0.95, "packing")
+    path = export_dir() / f"cohort-{job.id}.zip"
+    partial = path.with_suffix(".part")
+    manifest = [{
+        "wsi_file_id": slide.id,
+        "file_name": slide.original_filename,
+        "patient_id": slide.patient_id,
+        "study_instance_uid": slide.study_instance_uid,
+        "document": documents[slide.id].name,
+    } for slide in slides]
+    try:
+        # Level 1 deflate: JSON still shrinks several-fold at a fraction of the default cost;
+        # Parquet is compressed already
+        compression = zipfile.ZIP_STORED if fmt == "parquet" else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(partial, "w", compression, compresslevel=1) as archive:
+            for slide in slides:
+                archive.write(documents[slide.id], documents[slide.id].name)
+            archive.writestr("manifest.json", json.dumps({"format": fmt, "slides": manifest}, indent=2))
+        os.replace(partial, path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    shutil.rmtree(staging, ignore_errors=True)
+
+    return {"path": str(path), "format": fmt, "slides": len(slides)}
@@ -0,0 +1,237 @@
+"""
+Tile-level training dataset export, run as a ``dataset_export`` background job
+
+The slide is cut into tiles of a chosen Deep Zoom level and size. Each tile
+is written to a ZIP archive as an image PNG and a label mask PNG, where
+every pixel holds the class id of the annotation covering it (0 for
+none). Tiles outside the detected tissue area are never read, and tiles
+with too little tissue and no annotation are skipped.
+
+Reading, rasterizing and PNG-encoding tiles is spread across a process
+pool; the job thread finds the annotations of every tile with one STRtree
+query up front and appends finished tiles to the archive as they arrive,
+with a bounded number of tiles in flight.
+"""
+
+import io
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import shapely
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.annotation import Annotation
+from app.models.job import Job
+from app.models.wsi import WSIFile
+from app.utils.deepzoom import DeepZoomLayout
+from app.utils.geometry_metrics import stored_geometries
+from app.utils.job_queue import job_queue
+from app.utils.pyramid import read_pyramid_region
+from app.utils.slide_registry import is_flat_image, slide_namespace
+from app.utils.tissue import tissue_fraction
+from app.utils.wsi_processor import read_dzi_region
+
+POLYGONAL_TYPES = ("Polygon", "MultiPolygon")
+
+
+def export_dir() -> Path:
+    return Path(settings.CACHE_DIR) / "exports"
+
+
+def export_workers() -> int:
+    return settings.EXPORT_WORKERS or os.cpu_count() or 1
+
+
+def rasterize(wkb: List[bytes], class_ids: List[int], origin: Tuple[float, float],
+              downsample: float, size: Tuple[int, int]) -> np.ndarray:
+    """Label mask of level-0 polygons drawn onto a tile, later polygons on top
+
+    Coordinates of every polygon are transformed to tile pixels in one
+    vectorized pass; holes are cut by filling each polygon part with its
+    exterior and interior rings together.
+    """
+    mask = np.zeros((size[1], size[0]), dtype=np.uint8)
+    if not wkb:
+        return mask
+    geometries = shapely.from_wkb(wkb)
+    parts, part_owner = shapely.get_parts(geometries, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    coords = (shapely.get_coordinates(rings) - origin) / downsample
+    coords = np.round(coords).astype(np.int32)
+    ends = np.cumsum(shapely.get_num_coordinates(rings))
+
+    start = 0
+    part_rings = []
+    for i, end in enumerate(ends):
+        part_rings.append(coords[start:end])
+        start = end
+        if i + 1 == len(ends) or ring_part[i + 1] != ring_part[i]:
+            cv2.fillPoly(mask, part_rings, int(class_ids[part_owner[ring_part[i]]]))
+            part_rings = []
+    return mask
+
+
+def _png(image: Image.Image) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def render_dataset_tile(source: dict, level: int, col: int, row: int, tile_size: int,
+                        wkb: List[bytes], class_ids: List[int], min_tissue: float) -> Optional[tuple]:
+    """Read, check and encode one tile and its mask (runs in the process pool)
+
+    Returns ``(col, row, image_png, mask_png)``, or None for a background tile.
+    """
+    layout = DeepZoomLayout.from_size(source["width"], source["height"], tile_size)
+    x, y, width, height = layout.tile_bounds(level, col, row)
+    downsample = layout.downsample(level)
+
+    mask = rasterize(wkb, class_ids, (x * downsample, y * downsample), downsample, (width, height))
+    if source["is_flat"]:
+        image = read_pyramid_region(source["namespace"], level, x, y, width, height)
+    else:
+        image = read_dzi_region(source["file_path"], level, col, row, tile_size)
+    if not mask.any() and tissue_fraction(image) < min_tissue:
+        return None
+    return col, row, _png(image), _png(Image.fromarray(mask, mode="L"))
+
+
+def plan_tiles(layout: DeepZoomLayout, level: int, tree: shapely.STRtree,
+               tissue_bbox: Optional[list]) -> Tuple[List[tuple], int]:
+    """Tiles worth reading, as ``(col, row, annotation indexes)``, and the total tile count
+
+    Annotations of every tile are found with one bulk STRtree query. Tiles
+    outside the tissue bounding box are dropped unless annotated.
+    """
+    downsample = layout.downsample(level)
+    cols, rows = layout.level_tiles[level]
+    addresses = [(col, row) for row in range(rows) for col in range(cols)]
+    boxes = []
+    for col, row in addresses:
+        x, y, width, height = layout.tile_bounds(level, col, row)
+        boxes.append((x * downsample, y * downsample, (x + width) * downsample, (y + height) * downsample))
+    boxes = np.array(boxes, dtype=float)
+
+    tile_index, annotation_index = tree.query(shapely.box(*boxes.T), predicate="intersects")
+    order = np.lexsort((annotation_index, tile_index))
+    tile_index, annotation_index = tile_index[order], annotation_index[order]
+    bounds = np.searchsorted(tile_index, np.arange(len(addresses) + 1))
+
+    in_tissue = np.ones(len(addresses), dtype=bool)
+    if tissue_bbox:
+        in_tissue = ((boxes[:, 2] > tissue_bbox[0]) & (boxes[:, 0] < tissue_bbox[2])
+                     & (boxes[:, 3] > tissue_bbox[1]) & (boxes[:, 1] < tissue_bbox[3]))
+
+    tiles = []
+    for i, (col, row) in enumerate(addresses):
+        hits = annotation_index[bounds[i]:bounds[i + 1]]
+        if len(hits) or in_tissue[i]:
+            tiles.append((col, row, hits))
+    return tiles, len(addresses)
+
+
+@job_queue.handler("dataset_export")
+def export_dataset(db: Session, job: Job, report: Callable[[float, Optional[str]], None]) -> dict:
+    """Write image and label mask PNG pairs of every tissue tile of a slide into a ZIP"""
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == job.wsi_file_id).first()
+    if not wsi_file:
+        return {"skipped": "slide deleted"}
+    payload = job.payload or {}
+    tile_size = payload.get("tile_size", 512)
+    min_tissue = payload.get("min_tissue", 0.1)
+    layout = DeepZoomLayout.from_size(wsi_file.width, wsi_file.height, tile_size)
+    level = payload.get("level")
+    if level is None:
+        level = layout.max_level
+
+    query = db.query(Annotation.id, Annotation.label, Annotation.geometry_wkb).filter(
+        Annotation.wsi_file_id == wsi_file.id,
+        Annotation.deleted_at.is_(None),
+        Annotation.geometry_type.in_(POLYGONAL_TYPES)
+    )
+    if payload.get("layer_name"):
+        query = query.filter(Annotation.layer_name == payload["layer_name"])
+    rows = query.order_by(Annotation.id).all()
+    labels = sorted({row.label for row in rows})
+    if len(labels) > 255:
+        raise ValueError(f"{len(labels)} labels do not fit in an 8-bit mask")
+    class_of = {label: i + 1 for i, label in enumerate(labels)}
+    geometries = stored_geometries(rows)
+    wkb = [row.geometry_wkb for row in rows]
+    class_ids = [class_of[row.label] for row in rows]
+    tree = shapely.STRtree(geometries)
+
+    source = {
+        "width": wsi_file.width,
+        "height": wsi_file.height,
+        "file_path": wsi_file.file_path,
+        "namespace": slide_namespace(wsi_file),
+        "is_flat": is_flat_image(wsi_file),
+    }
+    tissue_bbox = ((wsi_file.wsi_metadata or {}).get("tissue") or {}).get("bbox")
+    tiles, total = plan_tiles(layout, level, tree, tissue_bbox)
+    report(0.0, "tiles")
+
+    path = export_dir() / f"dataset-{job.id}.zip"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_suffix(".part")
+    written = 0
+    done = 0
+    workers = export_workers()
+    try:
+        # Spawned workers do not inherit open slide handles or the job threads
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool, \
+                zipfile.ZipFile(staging, "w", zipfile.ZIP_STORED) as archive:
+            pending = set()
+            tile_iter = iter(tiles)
+
+            def submit_next() -> bool:
+                tile = next(tile_iter, None)
+                if tile is None:
+                    return False
+                col, row, hits = tile
+                pending.add(pool.submit(
+                    render_dataset_tile, source, level, col, row, tile_size,
+                    [wkb[i] for i in hits], [class_ids[i] for i in hits], min_tissue
+                ))
+                return True
+
+            while len(pending) < workers * 4 and submit_next():
+                pass
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    if result is not None:
+                        col, row, image_png, mask_png = result
+                        archive.writestr(f"images/{level}_{col}_{row}.png", image_png)
+                        archive.writestr(f"masks/{level}_{col}_{row}.png", mask_png)
+                        written += 1
+                    done += 1
+                    submit_next()
+                report(done / max(len(tiles), 1))
+
+            archive.writestr("labels.json", json.dumps({
+                "slide": wsi_file.original_filename,
+                "level": level,
+                "downsample": layout.downsample(level),
+                "tile_size": tile_size,
+                "classes": {"0": "background", **{str(i): label for label, i in class_of.items()}},
+            }, indent=2))
+        os.replace(staging, path)
+    except BaseException:
+        staging.unlink(missing_ok=True)
+        raise
+
+    return {"path": str(path), "level": level, "tiles": written, "skipped": total - written,
+            "labels": class_of}
@@ -0,0 +1,141 @@
+"""
+Deep Zoom (DZI) pyramid layout
+
+Maps Deep Zoom levels, which halve the image size from the full resolution
+down to 1x1 pixel, onto the native levels of a slide pyramid. Each Deep Zoom
+tile is read from the best native level for its downsample and then scaled
+by the remaining factor, so low-zoom tiles never touch level-0 pixels.
+"""
+
+import math
+from typing import List, Sequence, Tuple
+
+DZI_XMLNS = "http://schemas.microsoft.com/deepzoom/2008"
+
+
+class DeepZoomLayout:
+    """Deep Zoom geometry for a pyramid with the given native levels"""
+
+    def __init__(
+        self,
+        level_dimensions: Sequence[Sequence[int]],
+        level_downsamples: Sequence[float],
+        tile_size: int = 256,
+        overlap: int = 0,
+    ):
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.native_dimensions = [tuple(int(v) for v in dims) for dims in level_dimensions]
+        self.native_downsamples = [float(d) for d in level_downsamples]
+        self.width, self.height = self.native_dimensions[0]
+
+        # Deep Zoom levels, smallest first
+        size = (self.width, self.height)
+        dimensions = [size]
+        while size[0] > 1 or size[1] > 1:
+            size = (max(1, math.ceil(size[0] / 2)), max(1, math.ceil(size[1] / 2)))
+            dimensions.append(size)
+        self.level_dimensions: List[Tuple[int, int]] = list(reversed(dimensions))
+        self.level_count = len(self.level_dimensions)
+        self.level_tiles: List[Tuple[int, int]] = [
+            (math.ceil(w / tile_size), math.ceil(h / tile_size))
+            for w, h in self.level_dimensions
+        ]
+
+        # Native level and residual downsample for every Deep Zoom level
+        self._native_level = []
+        self._residual = []
+        for dz_level in range(self.level_count):
+            downsample = self.downsample(dz_level)
+            native = self.best_native_level(downsample)
+            self._native_level.append(native)
+            self._residual.append(downsample / self.native_downsamples[native])
+
+    @classmethod
+    def from_slide(cls, slide, tile_size: int = 256, overlap: int = 0) -> "DeepZoomLayout":
+        return cls(slide.level_dimensions, slide.level_downsamples, tile_size, overlap)
+
+    @classmethod
+    def from_size(cls, width: int, height: int, tile_size: int = 256, overlap: int = 0) -> "DeepZoomLayout":
+        """Layout for a single-resolution image"""
+        return cls([(width, height)], [1.0], tile_size, overlap)
+
+    @property
+    def max_level(self) -> int:
+        return self.level_count - 1
+
+    def downsample(self, dz_level: int) -> float:
+        """Downsample of a Deep Zoom level relative to full resolution"""
+        return float(2 ** (self.max_level - dz_level))
+
+    def best_native_level(self, downsample: float) -> int:
+        """Highest native level whose downsample does not exceed ``downsample``"""
+        best = 0
+        for level, level_downsample in enumerate(self.native_downsamples):
+            # Small tolerance so e.g. 3.9998 counts as a 4x level
+            if level_downsample <= downsample * 1.001:
+                best = level
+        return best
+
+    def native_level(self, dz_level: int) -> int:
+        return self._native_level[dz_level]
+
+    def check_tile(self, dz_level: int, col: int, row: int) -> None:
+        if dz_level < 0 or dz_level >= self.level_count:
+            raise ValueError("Invalid level")
+        cols, rows = self.level_tiles[dz_level]
+        if col < 0 or col >= cols or row < 0 or row >= rows:
+            raise ValueError("Invalid address")
+
+    def tile_bounds(self, dz_level: int, col: int, row: int) -> Tuple[int, int, int, int]:
+        """(x, y, width, height) of a tile, including overlap, in Deep Zoom level pixels"""
+        self.check_tile(dz_level, col, row)
+        level_w, level_h = self.level_dimensions[dz_level]
+        cols, rows = self.level_tiles[dz_level]
+        x = col * self.tile_size - (self.overlap if col > 0 else 0)
+        y = row * self.tile_size - (self.overlap if row > 0 else 0)
+        x_end = min(level_w, (col + 1) * self.tile_size + (self.overlap if col < cols - 1 else 0))
+        y_end = min(level_h, (row + 1) * self.tile_size + (self.overlap if row < rows - 1 else 0))
+        return x, y, x_end - x, y_end - y
+
+    def tile_region(self, dz_level: int, col: int, row: int):
+        """``read_region`` arguments plus the final tile size
+
+        Returns ``((l0_x, l0_y), native_level, (native_w, native_h), (tile_w, tile_h))``.
+        """
+        z_x, z_y, z_w, z_h = self.tile_bounds(dz_level, col, row)
+        native = self._native_level[dz_level]
+        residual = self._residual[dz_level]
+        native_downsample = self.native_downsamples[native]
+        native_w, native_h = self.native_dimensions[native]
+
+        # Position in native-level pixels, rounded down; size rounded up
+        l_x = z_x * residual
+        l_y = z_y * residual
+        l_w = int(min(math.ceil(z_w * residual), native_w - math.floor(l_x)))
+        l_h = int(min(math.ceil(z_h * residual), native_h - math.floor(l_y)))
+        l0_location = (int(l_x * native_downsample), int(l_y * native_downsample))
+        return l0_location, native, (max(1, l_w), max(1, l_h)), (z_w, z_h)
+
+    def dzi_xml(self, format: str = "jpeg") -> str:
+        """Deep Zoom descriptor document"""
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="{DZI_XMLNS}" Format="{format}" '
+            f'Overlap="{self.overlap}" TileSize="{self.tile_size}">'
+            f'<Size Width="{self.width}" Height="{self.height}"/>'
+            '</Image>'
+        )
+
+    def dzi_json(self, url: str, format: str = "jpeg") -> dict:
+        """Deep Zoom descriptor in the inline form accepted by OpenSeadragon"""
+        return {
+            "Image": {
+                "xmlns": DZI_XMLNS,
+                "Url": url,
+                "Format": format,
+                "Overlap": str(self.overlap),
+                "TileSize": str(self.tile_size),
+                "Size": {"Width": str(self.width), "Height": str(self.height)},
+            }
+        }
@@ -0,0 +1,79 @@
+"""
+Size accounting and least-recently-used eviction for on-disk caches
+
+Cache files are ordered by modification time, so readers refresh it with
+``os.utime`` on every hit. Usage is counted lazily by walking the cache
+directory and then tracked incrementally as files are added. Files ending
+in ``.tmp`` are still being written and are neither counted nor evicted.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+
+class DiskLRU:
+    """Byte budget of a cache directory, trimmed to 90% of the limit when exceeded"""
+
+    def __init__(self, root: Path, limit: int):
+        self.root = Path(root)
+        self.limit = limit
+        self._bytes: Optional[int] = None  # computed lazily on first write
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    @property
+    def usage(self) -> Optional[int]:
+        """Bytes in the cache, or None until first counted"""
+        with self._lock:
+            return self._bytes
+
+    def add(self, size: int) -> None:
+        """Account for a file of ``size`` bytes and evict if over the limit"""
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._files())
+            else:
+                self._bytes += size
+            over_limit = self._bytes > self.limit
+        if over_limit:
+            self._evict()
+
+    def reset(self) -> None:
+        """Recount on the next write, after files were removed outside ``add``"""
+        with self._lock:
+            self._bytes = None
+
+    def _files(self) -> Iterator[Tuple[float, int, str]]:
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                file_path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, file_path
+
+    def _evict(self) -> None:
+        """Delete least recently used files until usage drops to 90% of the limit"""
+        if not self._evict_lock.acquire(blocking=False):
+            return  # another thread is already evicting
+        try:
+            files = sorted(self._files())
+            total = sum(size for _, size, _ in files)
+            target = int(self.limit * 0.9)
+            for _, size, file_path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(file_path)
+                    total -= size
+                except OSError:
+                    pass
+            with self._lock:
+                self._bytes = total
+        finally:
+            self._evict_lock.release()
@@ -0,0 +1,99 @@
+"""
+Disk cache of finished annotation exports
+
+An export is fully determined by the slide, the format and its options and
+the slide's annotation revision, so the first export of a revision is
+saved under ``CACHE_DIR/export-cache/<slide id>/`` while it streams to the
+client and repeat exports are served straight from the file. Files of a
+slide are dropped when its annotations change; the store as a whole is
+bounded by ``EXPORT_CACHE_BYTES`` with least-recently-used eviction.
+"""
+
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.disk_lru import DiskLRU
+
+
+class ExportCache:
+    """Size-bounded disk store of export files, grouped by slide"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.limit = max_bytes
+        self._disk = DiskLRU(self.root, max_bytes)
+
+    def _path(self, wsi_id: int, key: Tuple) -> Path:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.root / str(wsi_id) / digest
+
+    def get(self, wsi_id: int, key: Tuple) -> Optional[Path]:
+        """Path of the cached export for ``key``, or None"""
+        path = self._path(wsi_id, key)
+        try:
+            os.utime(path)  # keep eviction roughly least-recently-used
+        except OSError:
+            return None
+        return path
+
+    def stream(self, wsi_id: int, key: Tuple, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Pass ``chunks`` through, saving them as the export for ``key`` if the stream completes"""
+        if self.limit <= 0:
+            yield from chunks
+            return
+
+        path = self._path(wsi_id, key)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            output = open(tmp_path, "wb")
+        except OSError:
+            yield from chunks
+            return
+
+        size = 0
+        saved = False
+        caching = True
+        try:
+            for chunk in chunks:
+                if caching:
+                    try:
+                        output.write(chunk)
+                        size += len(chunk)
+                    except OSError:
+                        caching = False  # the client still gets its export, uncached
+                yield chunk
+            output.close()
+            if caching:
+                try:
+                    os.replace(tmp_path, path)
+                    saved = True
+                except OSError:
+                    pass  # the slide's exports were invalidated while this one streamed
+        finally:
+            output.close()
+            # Release the exporter's database session even if the client went away
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+            if not saved:
+                tmp_path.unlink(missing_ok=True)
+        if saved:
+            self._disk.add(size)
+
+    def invalidate(self, wsi_id: int) -> None:
+        """Drop every cached export of a slide"""
+        # Recount on next write rather than walking the directory twice
+        self._disk.reset()
+        shutil.rmtree(self.root / str(wsi_id), ignore_errors=True)
+
+
+export_cache = ExportCache(
+    root=str(Path(settings.CACHE_DIR) / "export-cache"),
+    max_bytes=settings.EXPORT_CACHE_BYTES,
+)
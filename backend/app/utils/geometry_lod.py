@@ -0,0 +1,89 @@
+"""
+Level-of-detail simplification of annotation geometries
+
+At low zoom most vertices of a freehand outline fall into the same screen
+pixel. Geometries are simplified with a tolerance of a fraction of a
+screen pixel at the requested Deep Zoom level and kept in an in-memory LRU
+keyed by annotation id, version and level downsample, so each version is
+simplified at most once per zoom level.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import mapping
+
+from app.core.config import settings
+from app.utils.geometry_metrics import stored_geometries
+
+
+class SimplifiedGeometryCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int, float], dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[int, int, float]):
+        with self._lock:
+            geometry = self._entries.get(key)
+            if geometry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return geometry
+
+    def put(self, key: Tuple[int, int, float], geometry: dict) -> None:
+        with self._lock:
+            self._entries[key] = geometry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+simplified_cache = SimplifiedGeometryCache(settings.ANNOTATION_LOD_CACHE_ENTRIES)
+
+
+def simplify_geometries(geometries: np.ndarray, downsample: float) -> np.ndarray:
+    """Simplify an array of level-0 Shapely geometries for a level downsample"""
+    tolerance = downsample * settings.ANNOTATION_LOD_TOLERANCE_PX
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+def simplify_annotations(annotations: Iterable, downsample: float) -> Dict[int, dict]:
+    """Simplified GeoJSON geometry of each annotation, keyed by annotation id
+
+    ``downsample`` is the number of level-0 pixels per screen pixel.
+    Geometries that cannot be parsed are returned unchanged.
+    """
+    simplified: Dict[int, dict] = {}
+    misses = []
+    for annotation in annotations:
+        key = (annotation.id, annotation.version, downsample)
+        geometry = simplified_cache.get(key)
+        if geometry is None:
+            misses.append(annotation)
+        else:
+            simplified[annotation.id] = geometry
+
+    if not misses:
+        return simplified
+
+    # One vectorized GEOS call for every geometry not yet in the cache
+    for annotation, geom in zip(misses, simplify_geometries(stored_geometries(misses), downsample)):
+        if geom is None:
+            simplified[annotation.id] = annotation.geometry
+        else:
+            geometry = mapping(geom)
+            simplified_cache.put((annotation.id, annotation.version, downsample), geometry)
+            simplified[annotation.id] = geometry
+    return simplified
@@ -0,0 +1,38 @@
+"""
+HTTP validators for immutable slide-derived responses
+"""
+
+import hashlib
+
+from fastapi import Request
+from fastapi.responses import Response
+
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the identity of a response"""
+    digest = hashlib.sha1("/".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match already names ``etag``"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified(etag: str, cache_control: str = IMMUTABLE_CACHE_CONTROL) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def cached_response(content: bytes, media_type: str, etag: str,
+                    cache_control: str = IMMUTABLE_CACHE_CONTROL) -> Response:
+    return Response(
+        content=content, media_type=media_type,
+        headers={"ETag": etag, "Cache-Control": cache_control}
+    )
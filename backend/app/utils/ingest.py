@@ -0,0 +1,103 @@
+"""
+Slide ingest pipeline, run as an ``ingest`` background job
+
+Uploads return as soon as the bytes are stored. The job then extracts the
+slide metadata, builds the tile pyramid of flat images, detects the tissue
+area on a low-resolution overview, writes the slide previews and
+pre-renders the low-zoom Deep Zoom tiles every viewer opens with,
+reporting progress after each stage.
+"""
+
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.job import Job
+from app.models.wsi import WSIFile
+from app.utils.deepzoom import DeepZoomLayout
+from app.utils.job_queue import job_queue
+from app.utils.previews import generate_previews
+from app.utils.pyramid import build_pyramid, load_manifest, read_pyramid_overview
+from app.utils.slide_pool import slide_pool
+from app.utils.slide_registry import slide_namespace, is_flat_image, slide_registry
+from app.utils.tile_cache import tile_cache, dzi_tile_key
+from app.utils.tissue import detect_tissue
+from app.utils.wsi_processor import extract_slide_metadata, get_dzi_tile, get_slide_overview
+
+
+def _warm_tiles(file_path: str, namespace: str, max_tiles: int) -> int:
+    """Render the smallest Deep Zoom levels into the tile cache"""
+    with slide_pool.borrow(file_path) as slide:
+        layout = DeepZoomLayout.from_slide(slide, tile_size=settings.TILE_SIZE)
+
+    warmed = 0
+    for level in range(layout.level_count):
+        cols, rows = layout.level_tiles[level]
+        if warmed + cols * rows > max_tiles:
+            break
+        for row in range(rows):
+            for col in range(cols):
+                key = dzi_tile_key(namespace, level, col, row, "jpeg", settings.TILE_JPEG_QUALITY)
+                if tile_cache.get(key) is None:
+                    tile_cache.put(key, get_dzi_tile(
+                        file_path, level, col, row,
+                        tile_size=settings.TILE_SIZE, format="jpeg", quality=settings.TILE_JPEG_QUALITY
+                    ))
+                warmed += 1
+    return warmed
+
+
+@job_queue.handler("ingest")
+def ingest_slide(db: Session, job: Job, report: Callable[[float, Optional[str]], None]) -> dict:
+    """Extract metadata, build the pyramid, detect tissue, write previews and warm the tile cache"""
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == job.wsi_file_id).first()
+    if not wsi_file:
+        return {"skipped": "slide deleted"}
+
+    wsi_file.processing_status = "processing"
+    report(0.0, "metadata")
+    try:
+        for column, value in extract_slide_metadata(wsi_file.file_path, wsi_file.file_format).items():
+            setattr(wsi_file, column, value)
+        namespace = slide_namespace(wsi_file)
+        slide_registry.invalidate(wsi_file.id)
+        report(0.1, "pyramid" if is_flat_image(wsi_file) else "tissue")
+
+        if is_flat_image(wsi_file):
+            # A duplicate upload reuses the pyramid of the identical slide
+            manifest = load_manifest(namespace) or build_pyramid(
+                wsi_file.file_path, namespace,
+                tile_size=settings.TILE_SIZE, quality=settings.TILE_JPEG_QUALITY,
+                progress=lambda fraction: report(0.1 + 0.6 * fraction)
+            )
+            wsi_file.levels = manifest["levels"]
+            report(0.7, "tissue")
+            overview = read_pyramid_overview(namespace, settings.INGEST_OVERVIEW_SIZE)
+        else:
+            overview = get_slide_overview(wsi_file.file_path, settings.INGEST_OVERVIEW_SIZE)
+
+        tissue = detect_tissue(overview, wsi_file.width, wsi_file.height)
+        wsi_file.wsi_metadata = {**wsi_file.wsi_metadata, "tissue": tissue}
+        report(0.75, "previews")
+
+        associated = generate_previews(namespace, wsi_file.file_path, is_flat_image(wsi_file), overview)
+        wsi_file.wsi_metadata = {**wsi_file.wsi_metadata, "associated_images": associated}
+        report(0.8, "warm_cache")
+
+        # Pyramid tiles are already pre-encoded on disk
+        warmed = 0 if is_flat_image(wsi_file) else _warm_tiles(
+            wsi_file.file_path, namespace, settings.INGEST_WARM_TILES
+        )
+    except Exception as e:
+        db.rollback()
+        wsi_file.processing_status = "error"
+        wsi_file.wsi_metadata = {**(wsi_file.wsi_metadata or {}), "error": str(e)}
+        db.commit()
+        raise
+
+    wsi_file.is_processed = True
+    wsi_file.processing_status = "completed"
+    slide_registry.invalidate(wsi_file.id)
+    db.commit()
+    return {"width": wsi_file.width, "height": wsi_file.height, "tissue": tissue, "warmed_tiles": warmed}
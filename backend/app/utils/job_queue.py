@@ -0,0 +1,171 @@
+"""
+Local background job queue backed by the application database
+
+Jobs are rows in the ``jobs`` table, so their state survives restarts and is
+visible to every API worker without an external broker. Each process runs a
+small pool of worker threads that claim pending jobs with an atomic
+conditional UPDATE, which keeps several uvicorn workers from running the
+same job twice.
+"""
+
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Session, Job, Callable[[float, Optional[str]], None]], Optional[dict]]
+
+
+class JobQueue:
+    def __init__(self, workers: int, poll_seconds: float):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self._handlers: Dict[str, JobHandler] = {}
+        self._threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def handler(self, kind: str):
+        """Decorator registering the handler for a job kind"""
+        def register(func: JobHandler) -> JobHandler:
+            self._handlers[kind] = func
+            return func
+        return register
+
+    def enqueue(self, db: Session, kind: str, wsi_file_id: int = None,
+                payload: dict = None, creator_id: int = None) -> Job:
+        """Add a job; it becomes visible to workers when the caller commits"""
+        job = Job(
+            kind=kind,
+            wsi_file_id=wsi_file_id,
+            payload=payload or {},
+            creator_id=creator_id,
+            status="pending",
+            progress=0.0,
+            attempts=0
+        )
+        db.add(job)
+        db.flush()
+        self._wake.set()
+        return job
+
+    def start(self) -> None:
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        self._requeue_stale()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop, args=(f"{self._worker_prefix}:{i}",),
+                name=f"job-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _requeue_stale(self) -> None:
+        """Return jobs whose worker stopped heartbeating to the queue"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+        db = SessionLocal()
+        try:
+            stale = db.query(Job).filter(Job.status == "running", Job.updated_at < cutoff).all()
+            for job in stale:
+                if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+                    job.status = "error"
+                    job.message = "Worker stopped responding too many times"
+                    job.finished_at = datetime.utcnow()
+                else:
+                    job.status = "pending"
+                    job.worker = None
+            db.commit()
+        finally:
+            db.close()
+
+    def _claim(self, db: Session, worker: str) -> Optional[Job]:
+        candidates = (
+            db.query(Job.id)
+            .filter(Job.status == "pending", Job.kind.in_(list(self._handlers)))
+            .order_by(Job.id)
+            .limit(self.workers * 2)
+            .all()
+        )
+        for (job_id,) in candidates:
+            claimed = db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "pending")
+                .values(
+                    status="running",
+                    worker=worker,
+                    attempts=Job.attempts + 1,
+                    started_at=datetime.utcnow(),
+                    updated_at=datetime.utcnow()
+                )
+            ).rowcount
+            db.commit()
+            if claimed:
+                return db.query(Job).filter(Job.id == job_id).first()
+        return None
+
+    def _worker_loop(self, worker: str) -> None:
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                job = self._claim(db, worker)
+                if job is not None:
+                    self._run(db, job)
+                    continue
+            except Exception:
+                logger.exception("Job worker %s failed to claim a job", worker)
+            finally:
+                db.close()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def _run(self, db: Session, job: Job) -> None:
+        handler = self._handlers[job.kind]
+
+        def report(progress: float, stage: Optional[str] = None) -> None:
+            job.progress = max(0.0, min(1.0, progress))
+            if stage is not None:
+                job.stage = stage
+            job.updated_at = datetime.utcnow()
+            db.commit()
+
+        try:
+            result = handler(db, job, report)
+        except Exception as e:
+            db.rollback()
+            logger.error("Job %s (%s) failed: %s", job.id, job.kind, traceback.format_exc())
+            job.status = "error"
+            job.message = str(e)
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            return
+
+        job.status = "completed"
+        job.progress = 1.0
+        job.result = result
+        job.finished_at = datetime.utcnow()
+        db.commit()
+
+
+job_queue = JobQueue(workers=settings.JOB_WORKERS, poll_seconds=settings.JOB_POLL_SECONDS)
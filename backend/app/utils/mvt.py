@@ -0,0 +1,223 @@
+"""
+Mapbox Vector Tile encoder for annotation tiles
+
+A minimal writer for the MVT 2.1 protobuf format: geometries are clipped
+to the tile (plus a small buffer), quantized to the tile extent and encoded
+as delta-coded command streams. Only the message types the annotation tile
+endpoint needs are implemented, so no protobuf runtime is required.
+"""
+
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import shapely
+from shapely.geometry import (
+    LineString, MultiLineString, MultiPoint, MultiPolygon, Point, Polygon
+)
+from shapely.geometry.polygon import orient
+
+DEFAULT_EXTENT = 4096
+DEFAULT_BUFFER = 64
+
+_GEOM_POINT = 1
+_GEOM_LINESTRING = 2
+_GEOM_POLYGON = 3
+
+_CMD_MOVE_TO = 1
+_CMD_LINE_TO = 2
+_CMD_CLOSE_PATH = 7
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field: int, values: Iterable[int]) -> bytes:
+    return _length_delimited(field, b"".join(_varint(v) for v in values))
+
+
+def _command(command: int, count: int) -> int:
+    return (command & 0x7) | (count << 3)
+
+
+def _value(value) -> bytes:
+    """Encode a property value as a ``Tile.Value`` message"""
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _key(5, 0) + _varint(value)
+        return _key(6, 0) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack("<d", value)
+    payload = str(value).encode()
+    return _length_delimited(1, payload)
+
+
+class _Cursor:
+    """Delta-encodes successive integer coordinates of one feature"""
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+    def path(self, points: Sequence[Tuple[int, int]], closed: bool) -> List[int]:
+        commands = [_command(_CMD_MOVE_TO, 1)]
+        commands.extend(self._deltas(points[:1]))
+        if len(points) > 1:
+            commands.append(_command(_CMD_LINE_TO, len(points) - 1))
+            commands.extend(self._deltas(points[1:]))
+        if closed:
+            commands.append(_command(_CMD_CLOSE_PATH, 1))
+        return commands
+
+    def _deltas(self, points: Sequence[Tuple[int, int]]) -> List[int]:
+        out = []
+        for x, y in points:
+            out.append(_zigzag(x - self.x))
+            out.append(_zigzag(y - self.y))
+            self.x, self.y = x, y
+        return out
+
+
+def _quantize(coords, closed: bool) -> List[Tuple[int, int]]:
+    """Round to integers and drop consecutive duplicates (and the closing point)"""
+    points: List[Tuple[int, int]] = []
+    for x, y in coords:
+        point = (int(round(x)), int(round(y)))
+        if not points or points[-1] != point:
+            points.append(point)
+    if closed and len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+def _encode_geometry(geom) -> Tuple[Optional[int], List[int]]:
+    """MVT geometry type and command stream of a tile-space geometry"""
+    cursor = _Cursor()
+    if isinstance(geom, (Point, MultiPoint)):
+        points = [(int(round(p.x)), int(round(p.y))) for p in getattr(geom, "geoms", [geom])]
+        if not points:
+            return None, []
+        commands = [_command(_CMD_MOVE_TO, len(points))]
+        commands.extend(cursor._deltas(points))
+        return _GEOM_POINT, commands
+
+    if isinstance(geom, (LineString, MultiLineString)):
+        commands = []
+        for line in getattr(geom, "geoms", [geom]):
+            points = _quantize(line.coords, closed=False)
+            if len(points) >= 2:
+                commands.extend(cursor.path(points, closed=False))
+        return (_GEOM_LINESTRING, commands) if commands else (None, [])
+
+    if isinstance(geom, (Polygon, MultiPolygon)):
+        commands = []
+        for polygon in getattr(geom, "geoms", [geom]):
+            # Exterior rings must have positive area in tile coordinates
+            polygon = orient(polygon, sign=1.0)
+            exterior = _quantize(polygon.exterior.coords, closed=True)
+            if len(exterior) < 3:
+                continue
+            commands.extend(cursor.path(exterior, closed=True))
+            for interior in polygon.interiors:
+                ring = _quantize(interior.coords, closed=True)
+                if len(ring) >= 3:
+                    commands.extend(cursor.path(ring, closed=True))
+        return (_GEOM_POLYGON, commands) if commands else (None, [])
+
+    # Geometry collections: encode the polygonal, linear or point parts
+    for part_type in (Polygon, LineString, Point):
+        parts = [g for g in getattr(geom, "geoms", []) if isinstance(g, part_type)]
+        if parts:
+            return _encode_geometry(shapely.union_all(parts))
+    return None, []
+
+
+def to_tile_space(geom, bounds: Tuple[float, float, float, float], extent: int = DEFAULT_EXTENT,
+                  buffer: int = DEFAULT_BUFFER):
+    """Clip a level-0 geometry to tile ``bounds`` (plus buffer) and scale it to the extent"""
+    min_x, min_y, max_x, max_y = bounds
+    scale_x = extent / (max_x - min_x)
+    scale_y = extent / (max_y - min_y)
+    pad_x = buffer / scale_x
+    pad_y = buffer / scale_y
+    clipped = shapely.clip_by_rect(geom, min_x - pad_x, min_y - pad_y, max_x + pad_x, max_y + pad_y)
+    if clipped.is_empty:
+        return None
+    return shapely.transform(clipped, lambda c: (c - (min_x, min_y)) * (scale_x, scale_y))
+
+
+class LayerBuilder:
+    """Accumulates the features of one tile layer"""
+
+    def __init__(self, name: str, extent: int = DEFAULT_EXTENT):
+        self.name = name
+        self.extent = extent
+        self._features: List[bytes] = []
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[Tuple[type, object], int] = {}
+
+    def _tag(self, key: str, value) -> Tuple[int, int]:
+        key_index = self._keys.setdefault(key, len(self._keys))
+        value_index = self._values.setdefault((type(value), value), len(self._values))
+        return key_index, value_index
+
+    def add_feature(self, tile_geom, properties: Dict[str, object], feature_id: Optional[int] = None) -> bool:
+        """Add a tile-space geometry; returns False if it vanished after quantization"""
+        geom_type, commands = _encode_geometry(tile_geom)
+        if geom_type is None:
+            return False
+        tags = []
+        for key, value in properties.items():
+            if value is not None:
+                tags.extend(self._tag(key, value))
+        feature = b""
+        if feature_id is not None:
+            feature += _key(1, 0) + _varint(feature_id)
+        if tags:
+            feature += _packed(2, tags)
+        feature += _key(3, 0) + _varint(geom_type)
+        feature += _packed(4, commands)
+        self._features.append(feature)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def encode(self) -> bytes:
+        layer = _key(15, 0) + _varint(2)
+        layer += _length_delimited(1, self.name.encode())
+        for feature in self._features:
+            layer += _length_delimited(2, feature)
+        for key in self._keys:
+            layer += _length_delimited(3, key.encode())
+        for value_type, value in self._values:
+            layer += _length_delimited(4, _value(value))
+        layer += _key(5, 0) + _varint(self.extent)
+        return layer
+
+
+def encode_tile(layers: Iterable[LayerBuilder]) -> bytes:
+    """Serialize layers into a vector tile, skipping empty ones"""
+    return b"".join(_length_delimited(3, layer.encode()) for layer in layers if len(layer))
@@ -0,0 +1,99 @@
+"""
+Slide previews: thumbnails and associated (label, macro) images
+
+Previews are small JPEGs rendered from the lowest pyramid level or from the
+images OpenSlide exposes next to the pyramid. They are written once under
+``CACHE_DIR/previews/<namespace>`` (the default thumbnail and every
+associated image at ingest, other sizes on first request) and are never
+evicted, so slide lists can show them without touching the slide.
+"""
+
+import os
+import re
+import shutil
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from PIL import Image
+
+from app.core.config import settings
+from app.utils.pyramid import read_pyramid_overview
+from app.utils.wsi_processor import (
+    HAS_OPENSLIDE, encode_tile, get_associated_image, get_associated_image_names, get_slide_overview
+)
+
+PREVIEW_QUALITY = 80
+
+_IMAGE_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def preview_dir(namespace) -> Path:
+    return Path(settings.CACHE_DIR) / "previews" / str(namespace)
+
+
+def clamp_preview_size(max_size: Optional[int]) -> int:
+    return max(16, min(settings.THUMBNAIL_MAX_SIZE, max_size or settings.THUMBNAIL_SIZE))
+
+
+def _encode(image: Image.Image, max_size: Optional[int]) -> bytes:
+    image = image.copy()
+    if max_size:
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+    return encode_tile(image, "jpeg", PREVIEW_QUALITY)
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _cached(path: Path, render) -> bytes:
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        data = render()
+        _write(path, data)
+        return data
+
+
+def get_thumbnail(namespace, file_path: str, is_flat: bool, max_size: int) -> bytes:
+    """JPEG thumbnail fitting in ``max_size`` x ``max_size``"""
+    def render() -> bytes:
+        if is_flat:
+            overview = read_pyramid_overview(namespace, max_size)
+        else:
+            overview = get_slide_overview(file_path, max_size)
+        return _encode(overview, max_size)
+    return _cached(preview_dir(namespace) / f"thumbnail_{max_size}.jpeg", render)
+
+
+def get_associated_preview(namespace, file_path: str, name: str, max_size: Optional[int] = None) -> bytes:
+    """JPEG of an associated image, optionally downscaled; KeyError if the slide has none"""
+    if not _IMAGE_NAME.match(name):
+        raise KeyError(f"Slide has no {name} image")
+    suffix = f"_{max_size}" if max_size else ""
+    return _cached(
+        preview_dir(namespace) / f"associated_{name}{suffix}.jpeg",
+        lambda: _encode(get_associated_image(file_path, name), max_size)
+    )
+
+
+def generate_previews(namespace, file_path: str, is_flat: bool, overview: Image.Image) -> List[str]:
+    """Write the default thumbnail and all associated images; returns the associated image names"""
+    _write(
+        preview_dir(namespace) / f"thumbnail_{settings.THUMBNAIL_SIZE}.jpeg",
+        _encode(overview, settings.THUMBNAIL_SIZE)
+    )
+    if is_flat or not HAS_OPENSLIDE:
+        return []
+    names = get_associated_image_names(file_path)
+    for name in names:
+        get_associated_preview(namespace, file_path, name)
+    return names
+
+
+def delete_previews(namespace) -> None:
+    shutil.rmtree(preview_dir(namespace), ignore_errors=True)
@@ -0,0 +1,164 @@
+"""
+Deep Zoom pyramid builder for flat images
+
+OpenSlide cannot read plain JPEG/PNG/stripped TIFF uploads, so those are
+decoded once after upload and written as a directory of pre-encoded Deep
+Zoom tiles under ``CACHE_DIR/pyramids``. Tile requests then read a single
+small file instead of decoding the whole scan.
+"""
+
+import io
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+from PIL import Image
+
+from app.core.config import settings
+from app.utils.deepzoom import DeepZoomLayout
+from app.utils.wsi_processor import encode_tile
+
+MANIFEST_NAME = "manifest.json"
+
+# Flat scans are routinely larger than Pillow's decompression-bomb default
+Image.MAX_IMAGE_PIXELS = settings.MAX_FLAT_IMAGE_PIXELS
+
+
+def pyramid_dir(namespace) -> Path:
+    """Directory holding the pyramid of a slide"""
+    return Path(settings.CACHE_DIR) / "pyramids" / str(namespace)
+
+
+def load_manifest(namespace) -> Optional[dict]:
+    """Return the pyramid manifest, or None if the pyramid is not built yet"""
+    try:
+        with open(pyramid_dir(namespace) / MANIFEST_NAME) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pyramid_layout(manifest: dict) -> DeepZoomLayout:
+    return DeepZoomLayout.from_size(
+        manifest["width"], manifest["height"],
+        tile_size=manifest["tile_size"], overlap=manifest["overlap"]
+    )
+
+
+def read_pyramid_tile(namespace, level: int, col: int, row: int, format: str = "jpeg",
+                      quality: Optional[int] = None) -> bytes:
+    """Read a pre-encoded tile, re-encoding only if another format/quality is requested"""
+    manifest = load_manifest(namespace)
+    if manifest is None:
+        raise FileNotFoundError("Pyramid not built")
+    pyramid_layout(manifest).check_tile(level, col, row)
+
+    path = pyramid_dir(namespace) / str(level) / f"{col}_{row}.{manifest['format']}"
+    data = path.read_bytes()
+    if format == manifest["format"] and (quality is None or quality == manifest["quality"]):
+        return data
+    return encode_tile(Image.open(io.BytesIO(data)), format, quality or manifest["quality"])
+
+
+def read_pyramid_region(namespace, level: int, x: int, y: int, width: int, height: int) -> Image.Image:
+    """Stitch the pyramid tiles covering a rectangle of a level, in level pixels"""
+    manifest = load_manifest(namespace)
+    if manifest is None:
+        raise FileNotFoundError("Pyramid not built")
+    layout = pyramid_layout(manifest)
+    tile_size = manifest["tile_size"]
+    cols, rows = layout.level_tiles[level]
+
+    region = Image.new("RGB", (width, height), (255, 255, 255))
+    for row in range(y // tile_size, min(rows, (y + height - 1) // tile_size + 1)):
+        for col in range(x // tile_size, min(cols, (x + width - 1) // tile_size + 1)):
+            tile_x, tile_y, _, _ = layout.tile_bounds(level, col, row)
+            path = pyramid_dir(namespace) / str(level) / f"{col}_{row}.{manifest['format']}"
+            with Image.open(path) as tile:
+                region.paste(tile, (tile_x - x, tile_y - y))
+    return region
+
+
+def read_pyramid_overview(namespace, max_size: int) -> Image.Image:
+    """Stitch a pyramid level scaled to fit in ``max_size`` x ``max_size``"""
+    manifest = load_manifest(namespace)
+    if manifest is None:
+        raise FileNotFoundError("Pyramid not built")
+    layout = pyramid_layout(manifest)
+    # Smallest level that still covers max_size, so downscaling keeps detail
+    level = layout.max_level
+    for candidate, (w, h) in enumerate(layout.level_dimensions):
+        if max(w, h) >= max_size:
+            level = candidate
+            break
+
+    overview = read_pyramid_region(namespace, level, 0, 0, *layout.level_dimensions[level])
+    overview.thumbnail((max_size, max_size), Image.LANCZOS)
+    return overview
+
+
+def build_pyramid(image_path: str, namespace, tile_size: int = 256, overlap: int = 0,
+                  format: str = "jpeg", quality: int = 85,
+                  progress: Optional[Callable[[float], None]] = None) -> dict:
+    """Decode a flat image once and write its Deep Zoom tiles
+
+    The pyramid is written to a temporary directory and moved into place
+    only when complete, so readers never see a half-built pyramid.
+    """
+    target = pyramid_dir(namespace)
+    staging = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+    staging.mkdir(parents=True)
+    try:
+        with Image.open(image_path) as source:
+            width, height = source.size
+            if width * height > settings.MAX_FLAT_IMAGE_PIXELS:
+                raise ValueError(
+                    f"Image has {width * height} pixels, limit is {settings.MAX_FLAT_IMAGE_PIXELS}"
+                )
+            source.load()
+            image = source.convert("RGB")
+
+        layout = DeepZoomLayout.from_size(width, height, tile_size, overlap)
+        total_tiles = sum(cols * rows for cols, rows in layout.level_tiles)
+        done_tiles = 0
+        for level in range(layout.max_level, -1, -1):
+            level_dir = staging / str(level)
+            level_dir.mkdir()
+            level_w, level_h = layout.level_dimensions[level]
+            if image.size != (level_w, level_h):
+                image = image.resize((level_w, level_h), Image.LANCZOS)
+            cols, rows = layout.level_tiles[level]
+            for row in range(rows):
+                for col in range(cols):
+                    x, y, w, h = layout.tile_bounds(level, col, row)
+                    tile = image.crop((x, y, x + w, y + h))
+                    tile.save(level_dir / f"{col}_{row}.{format}", format=format.upper(), quality=quality)
+            done_tiles += cols * rows
+            if progress is not None:
+                progress(done_tiles / total_tiles)
+
+        manifest = {
+            "width": width,
+            "height": height,
+            "tile_size": tile_size,
+            "overlap": overlap,
+            "format": format,
+            "quality": quality,
+            "levels": layout.level_count,
+        }
+        with open(staging / MANIFEST_NAME, "w") as f:
+            json.dump(manifest, f)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        return manifest
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def delete_pyramid(namespace) -> None:
+    shutil.rmtree(pyramid_dir(namespace), ignore_errors=True)
@@ -0,0 +1,64 @@
+"""
+Annotation metric recomputation, run as a ``recompute_metrics`` background job
+
+Areas and perimeters are stored in microns, so they go stale when the
+resolution of a slide is corrected. The job re-measures every annotation of
+the slide with the vectorized geometry metrics, a batch of rows per UPDATE,
+reporting progress after each batch.
+"""
+
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.annotation import Annotation
+from app.models.job import Job
+from app.models.wsi import WSIFile
+from app.utils.annotation_revision import bump_annotation_revision
+from app.utils.geometry_metrics import METRIC_COLUMNS, annotation_metrics, geometries_from_geojson
+from app.utils.job_queue import job_queue
+
+
+@job_queue.handler("recompute_metrics")
+def recompute_metrics(db: Session, job: Job, report: Callable[[float, Optional[str]], None]) -> dict:
+    """Re-measure every annotation of a slide at its current resolution"""
+    wsi_file = db.query(WSIFile).filter(WSIFile.id == job.wsi_file_id).first()
+    if not wsi_file:
+        return {"skipped": "slide deleted"}
+
+    total = db.query(func.count(Annotation.id)).filter(Annotation.wsi_file_id == wsi_file.id).scalar()
+    report(0.0, "metrics")
+    last_id = 0
+    updated = 0
+    while True:
+        rows = (
+            db.query(Annotation.id, Annotation.geometry)
+            .filter(Annotation.wsi_file_id == wsi_file.id, Annotation.id > last_id)
+            .order_by(Annotation.id)
+            .limit(settings.ANNOTATION_METRICS_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+        metrics = annotation_metrics(
+            geometries_from_geojson([geometry for _, geometry in rows]), wsi_file.mpp_x, wsi_file.mpp_y
+        )
+        now = datetime.utcnow()
+        # Each batch is committed by report(), so each is its own revision
+        revision = bump_annotation_revision(db, wsi_file.id)
+        db.execute(update(Annotation), [
+            dict(
+                {column: metrics[column][i] for column in METRIC_COLUMNS},
+                id=annotation_id, updated_at=now, revision=revision
+            )
+            for i, (annotation_id, _) in enumerate(rows)
+        ])
+        updated += len(rows)
+        last_id = rows[-1][0]
+        report(updated / max(total, 1))
+
+    db.commit()
+    return {"annotations": updated, "mpp_x": wsi_file.mpp_x, "mpp_y": wsi_file.mpp_y}
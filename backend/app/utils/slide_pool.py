@@ -0,0 +1,206 @@
+"""
+Process-wide pool of open OpenSlide handles
+
+Opening a slide re-parses its TIFF directory, which is expensive for large
+.svs/.ndpi files. Tile handlers borrow handles from this LRU pool instead of
+opening and closing the slide for every tile.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+# Optional openslide import (requires system libraries)
+try:
+    import openslide
+    HAS_OPENSLIDE = True
+except ImportError:
+    HAS_OPENSLIDE = False
+    openslide = None
+
+
+class _PooledSlide:
+    """An open slide handle together with its bookkeeping"""
+
+    __slots__ = ("slide", "key", "last_used", "borrowers", "retired")
+
+    def __init__(self, slide, key: Tuple[str, float]):
+        self.slide = slide
+        self.key = key
+        self.last_used = time.monotonic()
+        self.borrowers = 0
+        self.retired = False
+
+
+class SlideHandlePool:
+    """LRU pool of open slide handles keyed by (path, mtime)
+
+    Handles that are evicted while borrowed are only closed once the last
+    borrower returns them, so eviction never pulls a slide out from under
+    a concurrent ``read_region`` call.
+    """
+
+    def __init__(self, max_size: int, idle_seconds: float, opener: Optional[Callable] = None):
+        self.max_size = max(1, max_size)
+        self.idle_seconds = idle_seconds
+        self._opener = opener
+        self._entries: "OrderedDict[Tuple[str, float], _PooledSlide]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self, path: str):
+        if self._opener is not None:
+            return self._opener(path)
+        if not HAS_OPENSLIDE:
+            raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
+        return openslide.OpenSlide(path)
+
+    @staticmethod
+    def _key(path: str) -> Tuple[str, float]:
+        path = os.path.abspath(path)
+        return (path, os.stat(path).st_mtime)
+
+    @contextmanager
+    def borrow(self, path: str):
+        """Borrow an open handle for ``path``, opening it on a pool miss"""
+        entry = self._acquire(path)
+        try:
+            yield entry.slide
+        finally:
+            self._release(entry)
+
+    def _acquire(self, path: str) -> _PooledSlide:
+        key = self._key(path)
+        to_close = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.borrowers += 1
+                entry.last_used = time.monotonic()
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Open outside the lock so one slow slide does not block the pool
+        slide = self._open(key[0])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Another thread opened the same slide meanwhile
+                to_close.append(slide)
+            else:
+                entry = _PooledSlide(slide, key)
+                self._entries[key] = entry
+                # A newer mtime means the file was replaced; drop stale handles
+                for other_key in list(self._entries):
+                    if other_key[0] == key[0] and other_key != key:
+                        to_close.extend(self._retire(other_key))
+                to_close.extend(self._evict_overflow())
+            self._entries.move_to_end(key)
+            entry.borrowers += 1
+            entry.last_used = time.monotonic()
+        self._close_all(to_close)
+        return entry
+
+    def _release(self, entry: _PooledSlide) -> None:
+        to_close = []
+        with self._lock:
+            entry.borrowers -= 1
+            entry.last_used = time.monotonic()
+            if entry.retired and entry.borrowers == 0:
+                to_close.append(entry.slide)
+            to_close.extend(self._evict_idle())
+        self._close_all(to_close)
+
+    def _retire(self, key) -> list:
+        """Remove ``key`` from the pool; return handles safe to close now"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return []
+        entry.retired = True
+        return [entry.slide] if entry.borrowers == 0 else []
+
+    def _evict_overflow(self) -> list:
+        to_close = []
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_size:
+                break
+            to_close.extend(self._retire(key))
+        return to_close
+
+    def _evict_idle(self) -> list:
+        if self.idle_seconds <= 0:
+            return []
+        deadline = time.monotonic() - self.idle_seconds
+        to_close = []
+        for key, entry in list(self._entries.items()):
+            if entry.borrowers == 0 and entry.last_used < deadline:
+                to_close.extend(self._retire(key))
+        return to_close
+
+    @staticmethod
+    def _close_all(slides) -> None:
+        for slide in slides:
+            try:
+                slide.close()
+            except Exception:
+                pass
+
+    def evict(self, path: str) -> None:
+        """Drop every pooled handle for ``path`` (e.g. when the slide is deleted)"""
+        path = os.path.abspath(path)
+        with self._lock:
+            to_close = []
+            for key in list(self._entries):
+                if key[0] == path:
+                    to_close.extend(self._retire(key))
+        self._close_all(to_close)
+
+    def evict_idle(self) -> None:
+        """Close handles that have not been borrowed within ``idle_seconds``"""
+        with self._lock:
+            to_close = self._evict_idle()
+        self._close_all(to_close)
+
+    async def evict_idle_periodically(self) -> None:
+        """Run ``evict_idle`` every ``idle_seconds`` until cancelled
+
+        Returns of borrowed handles already evict idle ones; this also
+        closes them once a process stops serving tiles altogether.
+        """
+        if self.idle_seconds <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.idle_seconds)
+            await asyncio.to_thread(self.evict_idle)
+
+    def clear(self) -> None:
+        """Close every pooled handle"""
+        with self._lock:
+            to_close = []
+            for key in list(self._entries):
+                to_close.extend(self._retire(key))
+        self._close_all(to_close)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open_handles": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+slide_pool = SlideHandlePool(
+    max_size=settings.SLIDE_HANDLE_POOL_SIZE,
+    idle_seconds=settings.SLIDE_HANDLE_IDLE_SECONDS,
+)
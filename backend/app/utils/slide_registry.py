@@ -0,0 +1,71 @@
+"""
+In-process lookup of slide identity for the tile path
+
+Tile requests only need a slide's cache namespace and file location, which
+never change for a given id. Caching them for a short TTL lets warm tile
+requests skip the database entirely.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class SlideRef:
+    wsi_id: int
+    namespace: str  # tile cache / pyramid key shared by identical slides
+    file_path: str
+    is_flat: bool  # served from a pre-built pyramid instead of OpenSlide
+
+
+def slide_namespace(wsi_file) -> str:
+    """Cache namespace of a slide: its content hash, or its id for legacy rows"""
+    return wsi_file.content_sha256 or f"wsi-{wsi_file.id}"
+
+
+def is_flat_image(wsi_file) -> bool:
+    return bool(wsi_file.wsi_metadata) and wsi_file.wsi_metadata.get("tile_source") == "pyramid"
+
+
+class SlideRegistry:
+    def __init__(self, ttl_seconds: float, max_entries: int = 4096):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[int, Tuple[SlideRef, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, wsi_id: int) -> Optional[SlideRef]:
+        with self._lock:
+            entry = self._entries.get(wsi_id)
+            if entry is None:
+                return None
+            ref, expires = entry
+            if expires < time.monotonic():
+                del self._entries[wsi_id]
+                return None
+            return ref
+
+    def remember(self, wsi_file) -> SlideRef:
+        """Cache the identity of a slide that is ready to serve tiles"""
+        ref = SlideRef(
+            wsi_id=wsi_file.id,
+            namespace=slide_namespace(wsi_file),
+            file_path=wsi_file.file_path,
+            is_flat=is_flat_image(wsi_file),
+        )
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[wsi_file.id] = (ref, time.monotonic() + self.ttl_seconds)
+        return ref
+
+    def invalidate(self, wsi_id: int) -> None:
+        with self._lock:
+            self._entries.pop(wsi_id, None)
+
+
+slide_registry = SlideRegistry(ttl_seconds=settings.SLIDE_REGISTRY_TTL_SECONDS)
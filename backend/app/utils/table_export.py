@@ -0,0 +1,154 @@
+"""
+Columnar annotation exports (Apache Parquet and the Arrow IPC file format)
+
+Annotations are written as typed columns with the geometry as WKB, one
+record batch per fetched chunk of rows, so analysis code loads them
+without re-parsing text. Parquet files are zstd-compressed and carry
+GeoParquet metadata; Arrow files are uncompressed so they can be
+memory-mapped. pyarrow is optional and these formats report as
+unavailable without it.
+"""
+
+import io
+import json
+from typing import BinaryIO, Iterable, Iterator
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.annotation import Annotation
+from app.utils.annotation_export import _batches, _live_annotations
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+TABLE_FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Rows also carry Annotation.wsi_file_id, selected by the caller
+TABLE_COLUMNS = (
+    Annotation.id, Annotation.label, Annotation.label_hierarchy, Annotation.geometry_type,
+    Annotation.area_um2, Annotation.perimeter_um, Annotation.centroid_x, Annotation.centroid_y,
+    Annotation.bbox_min_x, Annotation.bbox_min_y, Annotation.bbox_max_x, Annotation.bbox_max_y,
+    Annotation.confidence, Annotation.is_ai_generated, Annotation.ai_model_version,
+    Annotation.layer_name, Annotation.creator_id, Annotation.created_at, Annotation.updated_at,
+    Annotation.geometry_wkb
+)
+
+_schema = None
+
+
+def annotation_schema() -> "pa.Schema":
+    """Arrow schema of exported annotations; WKB geometry is described as GeoParquet"""
+    global _schema
+    if _schema is None:
+        geo = {
+            "version": "1.0.0",
+            "primary_column": "geometry",
+            "columns": {"geometry": {"encoding": "WKB", "geometry_types": []}},
+        }
+        _schema = pa.schema([
+            ("id", pa.int64()),
+            ("wsi_file_id", pa.int64()),
+            ("label", pa.string()),
+            ("label_hierarchy", pa.list_(pa.string())),
+            ("geometry_type", pa.string()),
+            ("area_um2", pa.float64()),
+            ("perimeter_um", pa.float64()),
+            ("centroid_x", pa.float64()),
+            ("centroid_y", pa.float64()),
+            ("bbox_min_x", pa.float64()),
+            ("bbox_min_y", pa.float64()),
+            ("bbox_max_x", pa.float64()),
+            ("bbox_max_y", pa.float64()),
+            ("confidence", pa.float64()),
+            ("is_ai_generated", pa.bool_()),
+            ("ai_model_version", pa.string()),
+            ("layer_name", pa.string()),
+            ("creator_id", pa.int64()),
+            ("created_at", pa.timestamp("us")),
+            ("updated_at", pa.timestamp("us")),
+            ("geometry", pa.binary()),
+        ], metadata={"geo": json.dumps(geo)})
+    return _schema
+
+
+def record_batch(rows: list) -> "pa.RecordBatch":
+    """Record batch of ``TABLE_COLUMNS`` rows (plus wsi_file_id)"""
+    schema = annotation_schema()
+    position = {name: i for i, name in enumerate(rows[0]._fields)}
+    position["geometry"] = position["geometry_wkb"]
+    values = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values[position[field.name]], type=field.type) for field in schema],
+        schema=schema
+    )
+
+
+def _writer(sink: BinaryIO, fmt: str):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, annotation_schema(), compression="zstd")
+    return pa.ipc.new_file(sink, annotation_schema())
+
+
+def write_table(sink: BinaryIO, fmt: str, batches: Iterable[list]) -> Iterator[None]:
+    """Write row batches to ``sink`` as a Parquet or Arrow file, yielding after each batch"""
+    writer = _writer(sink, fmt)
+    try:
+        for batch in batches:
+            writer.write_batch(record_batch(batch))
+            yield
+    finally:
+        writer.close()
+    yield
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting the bytes written since the last ``drain``"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def table_export(wsi_id: int, fmt: str) -> Iterator[bytes]:
+    """Stream the annotations of a slide as a Parquet or Arrow file"""
+    db = SessionLocal()
+    try:
+        query = _live_annotations(db, wsi_id, Annotation.wsi_file_id, *TABLE_COLUMNS)
+        sink = _ChunkSink()
+        for _ in write_table(sink, fmt, _batches(query, settings.EXPORT_TABLE_BATCH_SIZE)):
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        db.close()
+
+
+def write_table_file(path: str, fmt: str, rows: list) -> None:
+    """Write rows to a Parquet or Arrow file in batches of EXPORT_TABLE_BATCH_SIZE"""
+    size = settings.EXPORT_TABLE_BATCH_SIZE
+    with open(path, "wb") as output:
+        for _ in write_table(output, fmt, (rows[i:i + size] for i in range(0, len(rows), size))):
+            pass
@@ -0,0 +1,142 @@
+"""
+Two-tier cache for encoded tiles
+
+Encoded tile bytes are kept in a bounded in-memory LRU and in a sharded
+on-disk store under ``CACHE_DIR/tiles``. Keys are tuples whose first element
+is the slide namespace, so every tile of a slide can be invalidated at once.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.disk_lru import DiskLRU
+
+
+class TileCache:
+    """Memory byte-LRU in front of a size-bounded disk store"""
+
+    def __init__(self, root: str, memory_bytes: int, disk_bytes: int):
+        self.root = Path(root)
+        self.memory_limit = memory_bytes
+        self.disk_limit = disk_bytes
+        self._memory: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = DiskLRU(self.root, disk_bytes)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _namespace(key: Tuple) -> str:
+        return str(key[0])
+
+    def _path(self, key: Tuple) -> Path:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.root / self._namespace(key) / digest[:2] / digest
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        """Return cached bytes for ``key`` or None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # keep disk eviction roughly least-recently-used
+        except OSError:
+            pass
+        with self._lock:
+            self.disk_hits += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key: Tuple, data: bytes) -> None:
+        """Store ``data`` in both tiers"""
+        self._remember(key, data)
+        if self.disk_limit <= 0:
+            return
+
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        self._disk.add(len(data))
+
+    def _remember(self, key: Tuple, data: bytes) -> None:
+        if len(data) > self.memory_limit:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_limit and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def invalidate(self, namespace) -> None:
+        """Drop every cached tile of a slide from both tiers"""
+        namespace = str(namespace)
+        with self._lock:
+            for key in [k for k in self._memory if self._namespace(k) == namespace]:
+                self._memory_bytes -= len(self._memory.pop(key))
+        # Recount on next write rather than walking the directory twice
+        self._disk.reset()
+        shutil.rmtree(self.root / namespace, ignore_errors=True)
+
+    def clear(self) -> None:
+        """Drop everything from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        self._disk.reset()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_limit": self.memory_limit,
+                "disk_bytes": self._disk.usage,  # None until first counted
+                "disk_limit": self.disk_limit,
+            }
+
+
+def dzi_tile_key(namespace, level: int, col: int, row: int, format: str, quality: int) -> Tuple:
+    """Cache key of a Deep Zoom tile"""
+    return (namespace, "dzi", level, col, row, format, quality)
+
+
+tile_cache = TileCache(
+    root=str(Path(settings.CACHE_DIR) / "tiles"),
+    memory_bytes=settings.TILE_CACHE_MEMORY_BYTES,
+    disk_bytes=settings.TILE_CACHE_DISK_BYTES,
+)
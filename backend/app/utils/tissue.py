@@ -0,0 +1,45 @@
+"""
+Tissue detection on low-resolution slide overviews
+"""
+
+import numpy as np
+from PIL import Image
+
+# Background glass is bright and unsaturated; stained tissue is neither
+SATURATION_THRESHOLD = 20
+BRIGHTNESS_THRESHOLD = 235
+
+
+def tissue_mask(image: Image.Image) -> np.ndarray:
+    """Boolean mask of pixels that look like stained tissue"""
+    hsv = np.asarray(image.convert("HSV"))
+    rgb = np.asarray(image.convert("RGB"))
+    saturated = hsv[..., 1] > SATURATION_THRESHOLD
+    dark = rgb.min(axis=-1) < BRIGHTNESS_THRESHOLD
+    return saturated & dark
+
+
+def tissue_fraction(image: Image.Image) -> float:
+    """Fraction of an image covered by tissue"""
+    mask = tissue_mask(image)
+    return float(mask.mean()) if mask.size else 0.0
+
+
+def detect_tissue(overview: Image.Image, full_width: int, full_height: int) -> dict:
+    """Tissue coverage and level-0 bounding box of a slide from its overview"""
+    mask = tissue_mask(overview)
+    result = {"fraction": float(mask.mean()) if mask.size else 0.0, "bbox": None}
+    if not mask.any():
+        return result
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    scale_x = full_width / overview.width
+    scale_y = full_height / overview.height
+    result["bbox"] = [
+        int(cols[0] * scale_x),
+        int(rows[0] * scale_y),
+        min(full_width, int(np.ceil((cols[-1] + 1) * scale_x))),
+        min(full_height, int(np.ceil((rows[-1] + 1) * scale_y))),
+    ]
+    return result
@@ -14,12 +14,14 @@ from PIL import Image
 import io
 from pathlib import Path
 
+from app.utils.slide_pool import slide_pool
+from app.utils.deepzoom import DeepZoomLayout
+
 def process_wsi_file(file_path: str):
     """Process a WSI file and extract metadata"""
     if not HAS_OPENSLIDE:
         raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
-    slide = openslide.OpenSlide(file_path)
-    try:
+    with slide_pool.borrow(file_path) as slide:
         metadata = {
             "dimensions": slide.dimensions,
             "level_count": slide.level_count,
@@ -28,40 +30,103 @@ def process_wsi_file(file_path: str):
             "properties": dict(slide.properties)
         }
         return metadata
-    finally:
-        slide.close()
 
-def get_wsi_tile(file_path: str, level: int, x: int, y: int, tile_size: int = 256, format: str = "jpeg"):
+def to_rgb(tile: Image.Image) -> Image.Image:
+    """Flatten an RGBA region onto a white background"""
+    if tile.mode == "RGBA":
+        # Create white background
+        rgb_tile = Image.new("RGB", tile.size, (255, 255, 255))
+        rgb_tile.paste(tile, mask=tile.split()[3])  # Use alpha channel as mask
+        return rgb_tile
+    return tile.convert("RGB")
+
+def encode_tile(tile: Image.Image, format: str = "jpeg", quality: int = 85) -> bytes:
+    """Encode a tile image to bytes"""
+    output = io.BytesIO()
+    to_rgb(tile).save(output, format=format.upper(), quality=quality)
+    return output.getvalue()
+
+def get_wsi_tile(file_path: str, level: int, x: int, y: int, tile_size: int = 256, format: str = "jpeg", quality: int = 85):
     """Extract a tile from a WSI file"""
     if not HAS_OPENSLIDE:
         raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
-    slide = openslide.OpenSlide(file_path)
-    try:
+    with slide_pool.borrow(file_path) as slide:
         # Get tile
         tile = slide.read_region((x, y), level, (tile_size, tile_size))
-        
-        # Convert RGBA to RGB
-        if tile.mode == "RGBA":
-            # Create white background
-            rgb_tile = Image.new("RGB", tile.size, (255, 255, 255))
-            rgb_tile.paste(tile, mask=tile.split()[3])  # Use alpha channel as mask
-        else:
-            rgb_tile = tile.convert("RGB")
-        
-        # Convert to bytes
-        output = io.BytesIO()
-        rgb_tile.save(output, format=format.upper(), quality=85)
-        output.seek(0)
-        return output.getvalue()
-    finally:
-        slide.close()
+    
+    return encode_tile(tile, format, quality)
+
+WSI_EXTENSIONS = [".svs", ".tiff", ".tif", ".ndpi", ".mrxs"]
+FLAT_IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".tiff", ".tif"]
+
+def extract_slide_metadata(file_path: str, file_ext: str) -> dict:
+    """Read slide metadata with OpenSlide, falling back to Pillow for flat images
+    
+    Returns WSIFile column values. ``wsi_metadata["tile_source"]`` records
+    whether tiles come from OpenSlide or from a pre-built pyramid.
+    """
+    slide_format = None
+    if HAS_OPENSLIDE and file_ext in WSI_EXTENSIONS:
+        slide_format = openslide.OpenSlide.detect_format(file_path)
+    
+    if slide_format is not None:
+        with slide_pool.borrow(file_path) as slide:
+            return {
+                "width": slide.dimensions[0],
+                "height": slide.dimensions[1],
+                "mpp_x": float(slide.properties.get(openslide.PROPERTY_NAME_MPP_X, 0)),
+                "mpp_y": float(slide.properties.get(openslide.PROPERTY_NAME_MPP_Y, 0)),
+                "levels": slide.level_count,
+                "magnification": float(slide.properties.get(openslide.PROPERTY_NAME_OBJECTIVE_POWER, 0)),
+                "wsi_metadata": {**dict(slide.properties), "tile_source": "openslide"},
+            }
+    
+    if file_ext not in FLAT_IMAGE_EXTENSIONS:
+        if not HAS_OPENSLIDE:
+            raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
+        raise ValueError("Unsupported or corrupt slide file")
+    
+    # Regular image, served from a pre-built pyramid
+    with Image.open(file_path) as img:
+        width, height = img.size
+    return {
+        "width": width,
+        "height": height,
+        "mpp_x": None,
+        "mpp_y": None,
+        "levels": 1,
+        "magnification": None,
+        "wsi_metadata": {"tile_source": "pyramid"},
+    }
+
+def get_slide_overview(file_path: str, max_size: int) -> Image.Image:
+    """Low-resolution RGB image of a whole slide, read from its smallest levels"""
+    if not HAS_OPENSLIDE:
+        raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
+    with slide_pool.borrow(file_path) as slide:
+        return to_rgb(slide.get_thumbnail((max_size, max_size)))
+
+def get_associated_image_names(file_path: str) -> list:
+    """Names of the associated images (label, macro, ...) stored in a slide"""
+    if not HAS_OPENSLIDE:
+        raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
+    with slide_pool.borrow(file_path) as slide:
+        return sorted(slide.associated_images.keys())
+
+def get_associated_image(file_path: str, name: str) -> Image.Image:
+    """Read an associated image of a slide as RGB"""
+    if not HAS_OPENSLIDE:
+        raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
+    with slide_pool.borrow(file_path) as slide:
+        if name not in slide.associated_images:
+            raise KeyError(f"Slide has no {name} image")
+        return to_rgb(slide.associated_images[name])
 
 def get_wsi_info(file_path: str):
     """Get basic information about a WSI file"""
     if not HAS_OPENSLIDE:
         raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
-    slide = openslide.OpenSlide(file_path)
-    try:
+    with slide_pool.borrow(file_path) as slide:
         return {
             "width": slide.dimensions[0],
             "height": slide.dimensions[1],
@@ -71,5 +136,31 @@ def get_wsi_info(file_path: str):
             "mpp_y": float(slide.properties.get(openslide.PROPERTY_NAME_MPP_Y, 0)),
             "magnification": float(slide.properties.get(openslide.PROPERTY_NAME_OBJECTIVE_POWER, 0))
         }
-    finally:
-        slide.close()
+
+def get_dzi_layout(file_path: str, tile_size: int = 256, overlap: int = 0) -> DeepZoomLayout:
+    """Get the Deep Zoom layout of a WSI file"""
+    if not HAS_OPENSLIDE:
+        raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
+    with slide_pool.borrow(file_path) as slide:
+        return DeepZoomLayout.from_slide(slide, tile_size, overlap)
+
+def read_dzi_region(file_path: str, dz_level: int, col: int, row: int, tile_size: int = 256,
+                    overlap: int = 0) -> Image.Image:
+    """Read a Deep Zoom tile of a WSI file as an RGB image"""
+    if not HAS_OPENSLIDE:
+        raise ImportError("OpenSlide library not available. Install openslide-python and system libraries.")
+    with slide_pool.borrow(file_path) as slide:
+        layout = DeepZoomLayout.from_slide(slide, tile_size, overlap)
+        location, native_level, native_size, tile_dims = layout.tile_region(dz_level, col, row)
+        tile = slide.read_region(location, native_level, native_size)
+    
+    tile = to_rgb(tile)
+    if tile.size != tile_dims:
+        tile = tile.resize(tile_dims, Image.LANCZOS)
+    return tile
+
+def get_dzi_tile(file_path: str, dz_level: int, col: int, row: int, tile_size: int = 256,
+                 overlap: int = 0, format: str = "jpeg", quality: int = 85):
+    """Render a Deep Zoom tile from the best native level of a WSI file"""
+    tile = read_dzi_region(file_path, dz_level, col, row, tile_size, overlap)
+    return encode_tile(tile, format, quality)
@@ -7,13 +7,17 @@ from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
 from pathlib import Path
 
-from app.api import auth, annotations, wsi, labels, users, export, ai
+from app.api import auth, annotations, wsi, uploads, labels, users, export, ai
 from app.core.config import settings
 from app.core.database import engine, Base
 from app.core.security import get_current_user
+from app.utils.slide_pool import slide_pool
+from app.core.executors import password_executor, tile_executor
+from app.utils.job_queue import job_queue
 
 # Import init_database - handle if scripts directory doesn't exist
 try:
@@ -51,6 +55,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Sync-Cursor"],
 )
 
 # Mount static files for WSI tiles
@@ -61,12 +66,36 @@ app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
+app.include_router(uploads.router, prefix="/api/wsi/uploads", tags=["WSI Uploads"])
 app.include_router(wsi.router, prefix="/api/wsi", tags=["WSI"])
 app.include_router(annotations.router, prefix="/api/annotations", tags=["Annotations"])
 app.include_router(labels.router, prefix="/api/labels", tags=["Label Schemas"])
 app.include_router(export.router, prefix="/api/export", tags=["Export"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI-Assisted"])
 
+@app.on_event("startup")
+def start_job_workers():
+    """Start background job workers, retrying jobs left running by a crash"""
+    job_queue.start()
+
+@app.on_event("startup")
+async def start_periodic_cleanup():
+    """Discard abandoned chunked uploads and close idle slide handles"""
+    app.state.cleanup_tasks = [
+        asyncio.create_task(uploads.discard_stale_uploads_periodically()),
+        asyncio.create_task(slide_pool.evict_idle_periodically()),
+    ]
+
+@app.on_event("shutdown")
+def release_tile_resources():
+    """Stop cleanup tasks, job, tile and password workers and close pooled slide handles"""
+    for task in app.state.cleanup_tasks:
+        task.cancel()
+    job_queue.stop()
+    tile_executor.shutdown()
+    password_executor.shutdown()
+    slide_pool.clear()
+
 @app.get("/")
 async def root():
     return {
@@ -0,0 +1,86 @@
+"""
+Login latency benchmark
+
+Fires a burst of concurrent logins at a running server while a second set
+of clients keeps requesting a cheap endpoint, and reports latency
+percentiles for both. With password hashing on the event loop the probe
+latency climbs with the login burst; with the password pool it stays flat.
+
+    python scripts/bench_login.py --url http://localhost:8000 \\
+        --username admin --password admin123 --logins 50 --concurrency 10
+"""
+
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def _timed(request) -> tuple:
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return time.perf_counter() - start, status
+
+def _login(url: str, username: str, password: str) -> tuple:
+    body = urllib.parse.urlencode({"username": username, "password": password}).encode()
+    return _timed(urllib.request.Request(f"{url}/api/auth/login", data=body, method="POST"))
+
+def _report(name: str, samples: list) -> None:
+    latencies = sorted(latency for latency, _ in samples)
+    if not latencies:
+        print(f"{name}: no samples")
+        return
+    statuses = {}
+    for _, status in samples:
+        statuses[status] = statuses.get(status, 0) + 1
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"{name}: n={len(latencies)} p50={statistics.median(latencies) * 1000:.1f}ms "
+        f"p95={p95 * 1000:.1f}ms max={latencies[-1] * 1000:.1f}ms statuses={statuses}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--probe-path", default="/api/health", help="cheap endpoint polled during the burst")
+    args = parser.parse_args()
+    url = args.url.rstrip("/")
+
+    probes = []
+    done = threading.Event()
+
+    def probe():
+        while not done.is_set():
+            probes.append(_timed(urllib.request.Request(url + args.probe_path)))
+
+    prober = threading.Thread(target=probe, daemon=True)
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        logins = list(pool.map(
+            lambda _: _login(url, args.username, args.password), range(args.logins)
+        ))
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+
+    print(f"{args.logins} logins at concurrency {args.concurrency} in {elapsed:.2f}s "
+          f"({args.logins / elapsed:.1f}/s)")
+    _report("login", logins)
+    _report(f"probe {args.probe_path}", probes)
+
+if __name__ == "__main__":
+    main()
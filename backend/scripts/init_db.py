@@ -6,10 +6,12 @@ from app.core.database import SessionLocal, engine, Base
 from app.models.user import User, UserRole
 from app.models.label_schema import LabelSchema
 from app.core.security import get_password_hash
+from scripts.migrate_db import upgrade_schema
 
 def init_database():
     """Initialize database with default admin user and label schema"""
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
     db = SessionLocal()
     
     try:
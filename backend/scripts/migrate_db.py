@@ -0,0 +1,179 @@
+"""
+Bring an existing database schema up to date with the models
+
+The application creates tables with ``Base.metadata.create_all``, which
+never alters tables that already exist. This adds columns and indexes that
+were introduced after a database was created, rebuilds SQLite tables
+that must not reuse ids of deleted rows with AUTOINCREMENT, and recreates
+foreign keys whose ON DELETE action changed. It is idempotent and runs on
+every startup from ``init_database``.
+"""
+
+import shapely
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import AddConstraint, CreateTable
+
+from app.core.database import engine, Base
+import app.models  # noqa: F401  (register every model on Base.metadata)
+
+# Referencing columns whose values may outlive a deleted row of the table
+AUTOINCREMENT_REFERENCES = {
+    "wsi_files": [("annotations", "wsi_file_id"), ("jobs", "wsi_file_id"), ("upload_sessions", "wsi_file_id")],
+}
+
+def rebuild_sqlite_table(conn, table):
+    """Recreate a SQLite table from its model definition, keeping its rows
+
+    SQLite cannot alter constraints in place. Indexes are dropped with the
+    old table and recreated by ``upgrade_schema``.
+    """
+    existing_columns = {col["name"] for col in inspect(conn).get_columns(table.name)}
+    columns = ", ".join(f'"{column.name}"' for column in table.columns if column.name in existing_columns)
+    new_name = f"{table.name}__rebuild"
+    create = str(CreateTable(table).compile(dialect=engine.dialect))
+    conn.execute(text(create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {new_name} ", 1)))
+    conn.execute(text(f"INSERT INTO {new_name} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {new_name} RENAME TO {table.name}"))
+
+def rebuild_sqlite_autoincrement():
+    """Recreate SQLite tables declared with ``sqlite_autoincrement`` that predate it
+
+    Without AUTOINCREMENT SQLite hands the id of the newest row out again once
+    that row is deleted. The table is copied into a new AUTOINCREMENT table,
+    and the id sequence starts after the largest id still referenced anywhere
+    so leftovers of an already-deleted row are not attached to a new one.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not table.dialect_options["sqlite"].get("autoincrement"):
+                continue
+            ddl = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": table.name}
+            ).scalar()
+            if ddl is None or "AUTOINCREMENT" in ddl.upper():
+                continue
+            
+            rebuild_sqlite_table(conn, table)
+            highest = [f"SELECT MAX(id) FROM {table.name}"]
+            tables = set(inspect(conn).get_table_names())
+            for ref_table, ref_column in AUTOINCREMENT_REFERENCES.get(table.name, []):
+                if ref_table in tables:
+                    highest.append(f"SELECT MAX({ref_column}) FROM {ref_table}")
+            last_id = max(conn.execute(text(query)).scalar() or 0 for query in highest)
+            conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+            conn.execute(
+                text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                {"name": table.name, "seq": last_id}
+            )
+            print(f"Rebuilt {table.name} with AUTOINCREMENT (next id {last_id + 1})")
+
+def upgrade_foreign_keys():
+    """Recreate foreign keys whose ON DELETE action differs from the model"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            reflected = {
+                tuple(fk["constrained_columns"]): fk for fk in inspector.get_foreign_keys(table.name)
+            }
+            for constraint in table.foreign_key_constraints:
+                fk = reflected.get(tuple(constraint.column_keys))
+                if fk is None:
+                    continue
+                current = (fk.get("options", {}).get("ondelete") or "").upper()
+                if current == (constraint.ondelete or "").upper():
+                    continue
+                
+                if engine.dialect.name == "sqlite":
+                    rebuild_sqlite_table(conn, table)
+                    print(f"Rebuilt {table.name} with updated foreign keys")
+                    break
+                conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{fk["name"]}"'))
+                conn.execute(AddConstraint(constraint))
+                print(f"Recreated foreign key {table.name}.{', '.join(constraint.column_keys)}")
+
+def upgrade_schema():
+    """Add missing nullable columns and missing indexes to existing tables"""
+    rebuild_sqlite_autoincrement()
+    upgrade_foreign_keys()
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue  # created by create_all
+            
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                print(f"Added column {table.name}.{column.name}")
+            
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    print(f"Created index {index.name}")
+    
+    backfill_annotation_geometry()
+
+def backfill_annotation_geometry(batch_size: int = 1000):
+    """Store bounding boxes and WKB copies of annotations created before those columns"""
+    from sqlalchemy import or_, update
+    from app.core.database import SessionLocal
+    from app.models.annotation import Annotation
+    from app.utils.geometry_metrics import geometries_from_geojson, geometries_to_wkb
+    
+    db = SessionLocal()
+    try:
+        last_id = 0
+        updated = 0
+        while True:
+            rows = (
+                db.query(Annotation.id, Annotation.geometry)
+                .filter(
+                    Annotation.id > last_id,
+                    or_(Annotation.bbox_min_x.is_(None), Annotation.geometry_wkb.is_(None))
+                )
+                .order_by(Annotation.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            shapes = geometries_from_geojson([geometry for _, geometry in rows])
+            bounds = shapely.bounds(shapes)
+            wkb = geometries_to_wkb(shapes)
+            mappings = [
+                {
+                    "id": annotation_id,
+                    "bbox_min_x": bounds[i, 0], "bbox_min_y": bounds[i, 1],
+                    "bbox_max_x": bounds[i, 2], "bbox_max_y": bounds[i, 3],
+                    "geometry_wkb": wkb[i],
+                }
+                # Unparseable geometry stays out of viewport queries
+                for i, (annotation_id, _) in enumerate(rows) if wkb[i] is not None
+            ]
+            if mappings:
+                db.execute(update(Annotation), mappings)
+            db.commit()
+            updated += len(mappings)
+            last_id = rows[-1][0]
+        if updated:
+            print(f"Backfilled bounding boxes and WKB geometry of {updated} annotations")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
@@ -2,7 +2,7 @@ import axios from 'axios'
 import { useAuthStore } from '../store/authStore'
 
 // Use environment variable or fallback to relative path
-const API_BASE_URL = (import.meta.env?.VITE_API_URL as string) || '/api'
+export const API_BASE_URL = (import.meta.env?.VITE_API_URL as string) || '/api'
 
 const api = axios.create({
   baseURL: API_BASE_URL,
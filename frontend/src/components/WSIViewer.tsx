@@ -8,7 +8,7 @@ interface WSIViewerProps {
   wsiId: number
   width: number
   height: number
-  tileSource: string
+  tileSource: object
 }
 
 export function WSIViewer({ wsiId, width, height, tileSource }: WSIViewerProps) {
@@ -19,35 +19,10 @@ export function WSIViewer({ wsiId, width, height, tileSource }: WSIViewerProps)
   useEffect(() => {
     if (!viewerRef.current) return
 
-    // Custom tile source for WSI
-    const customTileSource = {
-      getTileUrl: (level: number, x: number, y: number) => {
-        return `${tileSource}?level=${level}&x=${x * 256}&y=${y * 256}&format=jpeg`
-      },
-      width: width,
-      height: height,
-      tileSize: 256,
-      tileOverlap: 0,
-      minLevel: 0,
-      maxLevel: 10,
-      getLevelScale: (level: number) => {
-        return 1 / Math.pow(2, level)
-      },
-      getNumTiles: (level: number) => {
-        const scale = 1 / Math.pow(2, level)
-        const levelWidth = Math.ceil(width * scale)
-        const levelHeight = Math.ceil(height * scale)
-        return {
-          x: Math.ceil(levelWidth / 256),
-          y: Math.ceil(levelHeight / 256),
-        }
-      },
-    }
-
     const osdViewer = OpenSeadragon({
       element: viewerRef.current,
       prefixUrl: 'https://openseadragon.github.io/openseadragon/images/',
-      tileSources: customTileSource,
+      tileSources: tileSource as any,
       showNavigationControl: true,
       showRotationControl: true,
       showFullPageControl: true,
@@ -66,6 +41,7 @@ export function WSIViewer({ wsiId, width, height, tileSource }: WSIViewerProps)
       setViewport({
         bounds: viewport.getBounds(),
         zoom: viewport.getZoom(),
+        imageZoom: viewport.viewportToImageZoom(viewport.getZoom()),
         center: viewport.getCenter(),
       })
     })
@@ -29,6 +29,8 @@ interface WSIFile {
   created_at: string
 }
 
+const THUMBNAIL_SIZE = 96
+
 export default function Dashboard() {
   const navigate = useNavigate()
   const { user } = useAuthStore()
@@ -41,6 +43,18 @@ export default function Dashboard() {
     },
   })
 
+  // One request for the whole page of previews instead of one per slide
+  const { data: thumbnails } = useQuery<Record<string, string>>({
+    queryKey: ['wsi-thumbnails', wsiFiles?.map((file) => file.id).join(',')],
+    queryFn: async () => {
+      const response = await api.get('/wsi/thumbnails', {
+        params: { ids: wsiFiles!.map((file) => file.id).join(','), max: THUMBNAIL_SIZE },
+      })
+      return response.data
+    },
+    enabled: !!wsiFiles && wsiFiles.length > 0,
+  })
+
   const handleView = (wsiId: number) => {
     navigate(`/viewer/${wsiId}`)
   }
@@ -88,6 +102,7 @@ export default function Dashboard() {
             <Table>
               <TableHead>
                 <TableRow>
+                  <TableCell>Preview</TableCell>
                   <TableCell>Filename</TableCell>
                   <TableCell>Dimensions</TableCell>
                   <TableCell>Magnification</TableCell>
@@ -98,6 +113,15 @@ export default function Dashboard() {
               <TableBody>
                 {wsiFiles?.map((file) => (
                   <TableRow key={file.id}>
+                    <TableCell sx={{ width: THUMBNAIL_SIZE, p: 1 }}>
+                      {thumbnails?.[file.id] && (
+                        <img
+                          src={thumbnails[file.id]}
+                          alt={file.original_filename}
+                          style={{ maxWidth: THUMBNAIL_SIZE, maxHeight: THUMBNAIL_SIZE, display: 'block' }}
+                        />
+                      )}
+                    </TableCell>
                     <TableCell>{file.original_filename}</TableCell>
                     <TableCell>
                       {file.width && file.height
@@ -1,15 +1,26 @@
 import { useParams } from 'react-router-dom'
-import { useQuery } from '@tanstack/react-query'
+import { useQuery, keepPreviousData } from '@tanstack/react-query'
 import { Box, Drawer, Typography, IconButton } from '@mui/material'
 import { Close } from '@mui/icons-material'
-import { useState, useEffect } from 'react'
-import api from '../api/client'
+import { useState, useEffect, useMemo, useRef } from 'react'
+import api, { API_BASE_URL } from '../api/client'
 import { WSIViewer } from '../components/WSIViewer'
 import { AnnotationToolbar } from '../components/AnnotationToolbar'
 import { AnnotationPanel } from '../components/AnnotationPanel'
 import { useAnnotationStore } from '../store/annotationStore'
+import { Annotation } from '../types/annotation'
 import toast from 'react-hot-toast'
 
+// How often collaborative sessions poll for other users' changes
+const SYNC_INTERVAL_MS = 5000
+
+interface AnnotationChanges {
+  annotations: Annotation[]
+  deleted: number[]
+  cursor: string
+  has_more: boolean
+}
+
 interface WSIFile {
   id: number
   filename: string
@@ -19,10 +30,22 @@ interface WSIFile {
   file_path: string
 }
 
+interface TileSourceInfo {
+  width: number
+  height: number
+  tileSize: number
+  tileOverlap: number
+  maxLevel: number
+  tileQuery: string
+}
+
 export default function Viewer() {
   const { wsiId } = useParams<{ wsiId: string }>()
   const [panelOpen, setPanelOpen] = useState(true)
-  const { setAnnotations } = useAnnotationStore()
+  const { setAnnotations, applyChanges, viewport } = useAnnotationStore()
+  const [viewBox, setViewBox] = useState<{ bbox: string; level: number } | null>(null)
+  // Changes cursor matching the annotations in the store
+  const syncCursor = useRef<string | null>(null)
 
   const { data: wsiFile, isLoading } = useQuery<WSIFile>({
     queryKey: ['wsi-file', wsiId],
@@ -33,20 +56,111 @@ export default function Viewer() {
     enabled: !!wsiId,
   })
 
-  const { data: wsiAnnotations } = useQuery<unknown[]>({
-    queryKey: ['annotations', wsiId],
+  const { data: tileSource } = useQuery<TileSourceInfo>({
+    queryKey: ['tile-source', wsiId],
     queryFn: async () => {
-      const response = await api.get(`/annotations/wsi/${wsiId}`)
+      const response = await api.get(`/wsi/${wsiId}/tile-source`)
       return response.data
     },
     enabled: !!wsiId,
   })
 
+  // Tile URLs carry a signed query string, so OpenSeadragon loads them as
+  // plain images the browser can cache instead of authenticated XHRs
+  const signedSource = useMemo(() => {
+    if (!tileSource) return null
+    return {
+      width: tileSource.width,
+      height: tileSource.height,
+      tileSize: tileSource.tileSize,
+      tileOverlap: tileSource.tileOverlap,
+      minLevel: 0,
+      maxLevel: tileSource.maxLevel,
+      getTileUrl: (level: number, x: number, y: number) =>
+        `${API_BASE_URL}/wsi/${wsiId}_files/${level}/${x}_${y}.jpeg?${tileSource.tileQuery}`,
+    }
+  }, [tileSource, wsiId])
+
+  // Only fetch annotations intersecting the (padded) viewport, once panning
+  // settles, at the Deep Zoom level being displayed so the server can
+  // simplify geometries that would collapse into single screen pixels
+  useEffect(() => {
+    if (!viewport || !wsiFile || !tileSource) return
+    const timer = setTimeout(() => {
+      const maxLevel = tileSource.maxLevel
+      const level = Math.max(
+        0,
+        Math.min(maxLevel, maxLevel + Math.floor(Math.log2(viewport.imageZoom)))
+      )
+      const downsample = 2 ** (maxLevel - level)
+      // OpenSeadragon viewport units are fractions of the image width
+      const { x, y, width, height } = viewport.bounds
+      const padX = width * 0.25
+      const padY = height * 0.25
+      setViewBox({
+        bbox: [x - padX, y - padY, x + width + padX, y + height + padY]
+          .map((v) => Math.round((v * wsiFile.width) / downsample))
+          .join(','),
+        level,
+      })
+    }, 250)
+    return () => clearTimeout(timer)
+  }, [viewport, wsiFile, tileSource])
+
+  const { data: wsiAnnotations, isPlaceholderData } = useQuery<{ annotations: Annotation[]; cursor: string | null }>({
+    queryKey: ['annotations', wsiId, viewBox],
+    queryFn: async () => {
+      const response = await api.get<Annotation[]>(`/annotations/wsi/${wsiId}`, {
+        params: viewBox!,
+      })
+      return { annotations: response.data, cursor: response.headers['x-sync-cursor'] ?? null }
+    },
+    enabled: !!wsiId && !!viewBox,
+    placeholderData: keepPreviousData,
+  })
+
   useEffect(() => {
     if (wsiAnnotations) {
-      setAnnotations(wsiAnnotations as any)
+      setAnnotations(wsiAnnotations.annotations)
+      // Placeholder data may still be the previous slide's
+      if (!isPlaceholderData) syncCursor.current = wsiAnnotations.cursor
     }
-  }, [wsiAnnotations, setAnnotations])
+  }, [wsiAnnotations, isPlaceholderData, setAnnotations])
+
+  // Pull only what changed since the last poll instead of reloading the
+  // whole annotation list, starting from the cursor the list came with
+  useEffect(() => {
+    if (!wsiId) return
+    let cancelled = false
+    let polling = false
+    const poll = async () => {
+      // Nothing to sync until the first annotation list has loaded
+      if (polling || !syncCursor.current) return
+      polling = true
+      try {
+        let hasMore = true
+        while (hasMore && !cancelled) {
+          const response = await api.get<AnnotationChanges>(`/annotations/wsi/${wsiId}/changes`, {
+            params: { since: syncCursor.current },
+          })
+          if (cancelled) return
+          applyChanges(response.data.annotations, response.data.deleted)
+          syncCursor.current = response.data.cursor
+          hasMore = response.data.has_more
+        }
+      } catch {
+        // Retried on the next poll
+      } finally {
+        polling = false
+      }
+    }
+    const timer = setInterval(poll, SYNC_INTERVAL_MS)
+    return () => {
+      cancelled = true
+      clearInterval(timer)
+      syncCursor.current = null
+    }
+  }, [wsiId, applyChanges])
 
   const handleSave = async () => {
     try {
@@ -75,14 +189,10 @@ export default function Viewer() {
     }
   }
 
-  if (isLoading || !wsiFile) {
+  if (isLoading || !wsiFile || !signedSource) {
     return <Box>Loading...</Box>
   }
 
-  // For now, use a placeholder tile source
-  // In production, this would be a DeepZoom or IIIF tile source
-  const tileSource = `/api/wsi/${wsiId}/tile?level=0&x=0&y=0&format=jpeg`
-
   return (
     <Box sx={{ display: 'flex', height: '100vh', overflow: 'hidden' }}>
       <Box sx={{ flex: 1, position: 'relative' }}>
@@ -91,7 +201,7 @@ export default function Viewer() {
           wsiId={parseInt(wsiId!)}
           width={wsiFile.width}
           height={wsiFile.height}
-          tileSource={tileSource}
+          tileSource={signedSource}
         />
       </Box>
 
@@ -4,6 +4,7 @@ import { Annotation } from '../types/annotation'
 interface Viewport {
   bounds: any
   zoom: number
+  imageZoom: number // screen pixels per full-resolution image pixel
   center: any
 }
 
@@ -18,6 +19,7 @@ interface AnnotationState {
   addAnnotation: (annotation: Annotation) => void
   updateAnnotation: (id: number, updates: Partial<Annotation>) => void
   deleteAnnotation: (id: number) => void
+  applyChanges: (changed: Annotation[], deletedIds: number[]) => void
   setSelectedAnnotation: (annotation: Annotation | null) => void
   setCurrentTool: (tool: AnnotationState['currentTool']) => void
   setCurrentLabel: (label: string) => void
@@ -45,6 +47,19 @@ export const useAnnotationStore = create<AnnotationState>((set) => ({
     set((state) => ({
       annotations: state.annotations.filter((ann) => ann.id !== id),
     })),
+  applyChanges: (changed, deletedIds) =>
+    set((state) => {
+      const deleted = new Set(deletedIds)
+      const byId = new Map(state.annotations.map((ann) => [ann.id, ann]))
+      for (const ann of changed) {
+        const current = byId.get(ann.id)
+        // A slower poll must not overwrite a newer local copy
+        if (!current || current.version <= ann.version) byId.set(ann.id, ann)
+      }
+      return {
+        annotations: Array.from(byId.values()).filter((ann) => !deleted.has(ann.id)),
+      }
+    }),
   setSelectedAnnotation: (annotation) => set({ selectedAnnotation: annotation }),
   setCurrentTool: (tool) => set({ currentTool: tool }),
   setCurrentLabel: (label) => set({ currentLabel: label }),